@@ -0,0 +1,267 @@
+import glob as gb
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.library.expr_handler as expr_handler
+import src.library.extract_handler as extract_handler
+import src.library.file_handler as file_handler
+import src.library.sched_backend as sched_backend
+import src.library.sched_handler as sched_handler
+import src.library.template_handler as template_handler
+
+BP_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# msg.error exits, raise SystemExit so tests can catch it
+def error(message):
+    raise SystemExit(message)
+
+
+# Minimal glob object for pure helpers
+def make_glob():
+    glob = types.SimpleNamespace(stg={'sl': '/'}, user="bp_test", tmp_job_file="tmp.job")
+    glob.args = types.SimpleNamespace(build=None, bench=None)
+    glob.lib = types.SimpleNamespace()
+    glob.lib.msg = types.SimpleNamespace(log=lambda *args: None, low=lambda *args: None, high=lambda *args: None,
+                                         warn=lambda *args: None, error=error)
+    glob.lib.files = file_handler.init(glob)
+    return glob
+
+
+# Output file with lines matched by shipped result exprs
+OUTPUT = """START 2020-01-01T00:00:00 1577836800
+Info: Performance: 1.0 ns/day 2.0 hours/ns
+Performance: 12.5 ns/day 1.9 hours/ns
+ Multiple Allreduce 8 1024 10 20 30 1.25X0.5
+Multiple Allreduce 8 2048 10 20 30 2.5X0.75
+ExecutionTime = 25.5 s  ClockTime = 26 s
+ExecutionTime = 51.25 s  ClockTime = 52 s
+TOTAL_TIME 10.5
+Triad:         1234.5     0.01      0.02      0.03
+Triad: a b c d e f g 99.9
+Final Summary::HPCG result is VALID with a GFLOP/s rating of=45.6
+WC00C2R2   1  2  3   7.75
+Performance 33.2 GF
+Performance 11 GF
+pi is approximately 3.1415926535897
+END 2020-01-01T00:10:00 1577837400
+"""
+
+
+class TestExtract(unittest.TestCase):
+
+    def setUp(self):
+        self.extract = extract_handler.init(make_glob())
+        self.tmp_dir = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.tmp_dir, "output.log")
+        with open(self.output_file, "w") as fp:
+            fp.write(OUTPUT)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # Run expression with shell, as result_handler.with_expr() does
+    def shell(self, expr):
+        try:
+            return subprocess.run(expr.replace("[output_file]", self.output_file), shell=True,
+                                  check=True, capture_output=True, universal_newlines=True).stdout.strip()
+        except subprocess.CalledProcessError:
+            return None
+
+    def assert_matches_shell(self, expr):
+        pipeline = self.extract.compile(expr)
+        if pipeline:
+            self.assertEqual(self.extract.run(pipeline, self.output_file), self.shell(expr), expr)
+        return bool(pipeline)
+
+    def test_shipped_exprs(self):
+        exprs = set()
+        for cfg_file in gb.glob(os.path.join(BP_REPO, "benchpro", "bench", "config", "**", "*.cfg"), recursive=True):
+            with open(cfg_file) as fp:
+                exprs.update(match.group(1).strip() for match in [re.match(r"expr\s*=\s*(.*)", line) for line in fp] if match)
+
+        self.assertTrue(exprs)
+        compiled = [expr for expr in sorted(exprs) if self.assert_matches_shell(expr)]
+        # Common grep/tail/cut/awk/rev pipelines are evaluated natively
+        self.assertGreaterEqual(len(compiled), len(exprs) // 2)
+
+    def test_pipelines(self):
+        for expr in ["grep 'Performance' [output_file] | tail -1",
+                     "grep -v 'ns' [output_file] | head -n 2",
+                     "grep 'Perf.rmance' [output_file]",
+                     "grep Perf [output_file] | awk '{print $NF}'",
+                     "grep 'ns/day' [output_file] | tail -n 0",
+                     "grep TOTAL [output_file] | cut -f 2",
+                     "grep Triad [output_file] | tail -n 1 | awk {'print $1,$9'}",
+                     "grep 'not in output' [output_file]",
+                     "grep 'not in output' [output_file] | tail -n 1",
+                     "tail -n 3 [output_file]",
+                     "head -2 [output_file] | rev"]:
+            self.assertTrue(self.assert_matches_shell(expr), expr)
+
+    def test_shell_required(self):
+        for expr in ["grep x [output_file] > out.txt",
+                     "grep x [output_file]; rm out.txt",
+                     "grep \"$HOME\" [output_file]",
+                     "grep `whoami` [output_file]",
+                     "grep x [output_file] | sort",
+                     "grep 'x [output_file]"]:
+            self.assertIsNone(self.extract.compile(expr), expr)
+
+
+class TestHostlist(unittest.TestCase):
+
+    def setUp(self):
+        self.sched = sched_handler.init(make_glob())
+
+    def test_parse_nodelist(self):
+        self.assertEqual(self.sched.parse_nodelist("c001"), ["c001"])
+        self.assertEqual(self.sched.parse_nodelist("c478-[094,102],c479-[032,094]"),
+                         ["c478-094", "c478-102", "c479-032", "c479-094"])
+        self.assertEqual(self.sched.parse_nodelist("c[098-100]"), ["c098", "c099", "c100"])
+        self.assertEqual(self.sched.parse_nodelist("nid[00008-00010]"), ["nid00008", "nid00009", "nid00010"])
+        self.assertEqual(self.sched.parse_nodelist("r[1-2]n[01-02]"), ["r1n01", "r1n02", "r2n01", "r2n02"])
+        self.assertEqual(self.sched.parse_nodelist("node[1-2]-ib"), ["node1-ib", "node2-ib"])
+        self.assertEqual(self.sched.parse_nodelist("a[1-2,05],b2"), ["a05", "a1", "a2", "b2"])
+
+    def test_not_started(self):
+        self.assertEqual(self.sched.parse_nodelist("None assigned"), [])
+        self.assertEqual(self.sched.parse_nodelist(""), [])
+        self.assertEqual(self.sched.parse_nodelist(None), [])
+
+    def test_expand_array_id(self):
+        backend = sched_backend.Slurm(make_glob())
+        self.assertEqual(backend.expand_array_id("123_4"), ["123_4"])
+        self.assertEqual(backend.expand_array_id("123_[0-3,5%2]"), ["123_0", "123_1", "123_2", "123_3", "123_5"])
+
+
+class TestExpr(unittest.TestCase):
+
+    def setUp(self):
+        self.glob = make_glob()
+        self.expr = expr_handler.init(self.glob)
+
+    def test_arithmetic(self):
+        self.assertEqual(self.expr.evaluate_arithmatic("56 \\/ 4"), 14)
+        self.assertEqual(self.expr.evaluate_arithmatic("2 \\* 3 \\+ 1"), 7)
+        self.assertEqual(self.expr.evaluate_arithmatic("10 \\- 3"), 7)
+
+    def test_reject_unsafe(self):
+        for expr in ["__import__('os').system('true')",
+                     "open('/etc/passwd').read()",
+                     "().__class__.__bases__",
+                     "[x for x in range(10)]",
+                     "lambda: 1",
+                     "2 ** 100000",
+                     "'a' * 10",
+                     "1 / 0"]:
+            with self.assertRaises(SystemExit, msg=expr):
+                self.expr.evaluate_arithmatic(expr)
+
+    def test_reject_unsafe_rule(self):
+        self.expr.search_space = [{'nodes': '4'}]
+        rule = expr_handler.Rule("[nodes] == __import__('os').getpid() : [queue] = 'x'")
+        with self.assertRaises(SystemExit):
+            self.expr.eval_rule(rule)
+
+    def test_rule(self):
+        rule = expr_handler.Rule("[nodes] >= 3 AND [nodes] < 512 : [queue] = 'normal'")
+        self.assertEqual([rule.inputs, rule.key, rule.value], [["nodes"], "queue", "normal"])
+        for nodes, fired in [("2", False), ("3", True), ("512", False)]:
+            self.expr.search_space = [{'nodes': nodes}]
+            self.expr.owners = {}
+            self.assertEqual(self.expr.eval_rule(rule), fired)
+
+        rule = expr_handler.Rule("\"[build_label]\" == \"cuda\" : [queue] = 'rtx'")
+        self.expr.search_space = [{'build_label': 'cuda'}]
+        self.expr.owners = {}
+        self.assertTrue(self.expr.eval_rule(rule))
+
+        # Ingested rule from rules cache file
+        self.assertEqual(expr_handler.Rule(rule.line, rule.to_dict()).to_dict(), rule.to_dict())
+
+    def test_dependency_order(self):
+        # Keys refer to keys defined later in the same dict
+        cfg = {'total': "<<<nodes>>> \\* <<<per_node>>>", 'per_node': "<<<cores>>> \\/ 2", 'cores': "56", 'nodes': "4"}
+        self.glob.args.build = True
+        self.glob.config = {'general': cfg, 'config': {}}
+        self.glob.sched = {'sched': {}}
+        self.glob.system = {}
+        self.expr.eval_dict(cfg, False)
+        self.assertEqual(cfg, {'total': "112", 'per_node': "28", 'cores': "56", 'nodes': "4"})
+
+    def test_circular_reference(self):
+        cfg = {'a': "<<<b>>>", 'b': "<<<a>>>"}
+        self.glob.args.build = True
+        self.glob.config = {'general': cfg, 'config': {}}
+        self.glob.sched = {'sched': {}}
+        self.glob.system = {}
+        with self.assertRaises(SystemExit):
+            self.expr.eval_dict(cfg, False)
+
+
+class TestTemplate(unittest.TestCase):
+
+    def test_render(self):
+        template = template_handler.init(make_glob())
+        template_obj = ["#SBATCH -N <<<nodes>>>\n",
+                        "cd <<<working_path>>> && ./<<<exe>>> <<<missing>>>\n",
+                        "export OMP_NUM_THREADS=<<<threads>>>\n"]
+        # First dict containing key takes precedence, list values use first element
+        cfg_dicts = [{'nodes': ['4', '8'], 'exe': "<<<code>>>.x"}, {'working_path': "/path", 'code': "lmp", 'threads': 2, 'nodes': 1}]
+
+        self.assertEqual(template.render(cfg_dicts, template_obj),
+                         [["#SBATCH -N 4\n", "cd /path && ./lmp.x <<<missing>>>\n", "export OMP_NUM_THREADS=2\n"],
+                          ["<<<missing>>>"]])
+        # Compiled template is reused
+        self.assertIs(template.compile_template(template_obj), template.compile_template(list(template_obj)))
+
+
+class TestFakeBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.glob = make_glob()
+        self.glob.stg.update({'fake_sched_path': os.path.join(self.tmp_dir, "fake"), 'fake_queue_secs': 0, 'fake_run_secs': 60})
+        self.backend = sched_backend.Fake(self.glob)
+        self.script = os.path.join(self.tmp_dir, "bench.job")
+        with open(self.script, "w") as fp:
+            fp.write("#!/bin/bash\n#SBATCH -J test_bench\n#SBATCH -N 2\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_submit(self):
+        jobid, stderr = self.backend.submit(self.script)
+        self.assertEqual(stderr, [])
+        self.assertEqual(self.backend.query([jobid]), {jobid: "RUNNING"})
+        self.assertEqual(self.backend.nodelist(jobid), "fake-[002-003]")
+
+        # Dependent job waits for first job to finish
+        dep_jobid, stderr = self.backend.submit(self.script, "afterok:" + jobid)
+        self.assertNotEqual(dep_jobid, jobid)
+        self.assertEqual(self.backend.query([dep_jobid]), {dep_jobid: "PENDING"})
+        self.assertEqual(self.backend.nodelist(dep_jobid), "None assigned")
+
+        jobs = self.backend.list_user_jobs(1)
+        self.assertEqual(sorted(job['jobid'] for job in jobs), sorted([jobid, dep_jobid]))
+        self.assertTrue(all(job['name'] == "test_bench" for job in jobs))
+
+    def test_array(self):
+        # 4 tasks, 2 at a time
+        jobid, stderr = self.backend.submit(self.script, "", [4, 2])
+        states = self.backend.query([jobid + "_" + str(idx) for idx in range(5)])
+        self.assertEqual(states, {jobid + "_0": "RUNNING", jobid + "_1": "RUNNING",
+                                  jobid + "_2": "PENDING", jobid + "_3": "PENDING"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,6 +12,11 @@ import src.logger as logger
 
 glob = None
 
+# cfg sections evaluated for each bench script
+sweep_sections = ['config', 'runtime', 'files', 'result']
+# Runtime keys iterated over in sweep
+sweep_runtime_keys = ['nodes', 'threads', 'ranks_per_node', 'gpus']
+
 
 # Get code info
 def get_app_info():
@@ -50,7 +55,7 @@ def get_app_info():
         glob.lib.msg.high("Attempting to build now...")
 
         # Set build args
-        build_glob = copy.deepcopy(glob)
+        build_glob = glob.session_copy()
         build_glob.args.build = copy.deepcopy(glob.config['requirements'])
         build_glob.args.bench = None
         # Suppress output
@@ -108,6 +113,7 @@ def get_app_info():
     # Build job running
     if glob.ok_dep_list:
         glob.lib.msg.low(glob.build_report['code'] + " build job is still running, creating dependency")
+        glob.config['metadata']['build_running'] = True
     # Build job complete
     else:
         # dry_run=False
@@ -135,10 +141,10 @@ def get_app_info():
 # Generate the bench script
 def gen_bench_script():
 
-    # Evaluate math in cfg dict -
+    # Evaluate math in cfg dict, invariant keys were evaluated once for the sweep
     glob.args.build = None
-    for sect in ['config','runtime', 'files', 'result']:
-        glob.lib.expr.eval_dict(glob.config[sect], True)
+    for sect in sweep_sections:
+        glob.lib.expr.eval_dict(glob.config[sect], True, glob.sweep_keys)
 
     # Update GPU default if arch=cuda
     if (glob.config['config']['arch'] == "cuda") and not glob.config['runtime']['gpus']:
@@ -221,23 +227,12 @@ def start_task():
     else:
         # bench_mode = sched
         if glob.stg['exec_mode'] == "sched":
-            # Get dep list
-            try:
-                job_limit = int(glob.config['runtime']['max_running_jobs'])
-            except:
-                glob.lib.msg.error("'max_running_jobs' value '" + \
-                                        glob.config['runtime']['max_running_jobs'] + "' is not an integer")
-
-            if len(glob.prev_task_id) >= job_limit:
-                glob.lib.msg.low("Max running jobs reached, creating dependency")
-                glob.any_dep_list.append(glob.prev_task_id[-1 * job_limit])
-
-            # Submit job
-            glob.lib.sched.submit()
-            #glob.task_id = glob.lib.submit_job( glob.lib.get_dep_str(), \
-            #                                glob.config['metadata']['working_path'], \
-            #                                glob.config['metadata']['job_script'])
-            glob.prev_task_id.append(glob.task_id)
+            # Submit later with other tasks of this sweep
+            if glob.stg['array_submit']:
+                defer_task()
+                return
+
+            submit_task()
 
         # bench_mode = local
         elif glob.stg['exec_mode'] == "local":
@@ -245,20 +240,87 @@ def start_task():
             if not glob.config['result']['output_file']:
                 glob.config['result']['output_file'] = glob.stg['output_file']
 
-            # Start task in local script
-            glob.lib.proc.start_local_shell()
+            # Queue task in local executor, store task ID for report
+            glob.task_id = glob.lib.proc.start_local_shell()
+
+    finish_task()
+
+
+# Get max_running_jobs as int
+def get_job_limit() -> int:
+    try:
+        return int(glob.config['runtime']['max_running_jobs'])
+    except:
+        glob.lib.msg.error("'max_running_jobs' value '" + \
+                                glob.config['runtime']['max_running_jobs'] + "' is not an integer")
+
 
-            # Store PID for report
-            glob.task_id = glob.prev_pid
+# Submit bench script to scheduler
+def submit_task():
+    job_limit = get_job_limit()
 
-    # Use stdout for output if not set
-    if not glob.config['result']['output_file']:
+    # Hold task in submit queue, drain releases it once fewer than max_running_jobs queue jobs are unfinished
+    if job_limit > 0:
+        glob.lib.sched.enqueue(job_limit)
+        return
+
+    # No limit, submit job
+    glob.lib.sched.submit()
+
+
+# Generate bench report once task ID is known
+def finish_task():
+
+    # Use stdout for output if not set, queued tasks set it once submitted
+    if not glob.config['result']['output_file'] and glob.task_id != "queued":
         glob.config['result']['output_file'] = glob.task_id + ".out"
 
     # Generate bench report
     glob.lib.report.bench()
 
 
+# Hold task for job array submission
+def defer_task():
+    script_path = os.path.join(glob.config['metadata']['working_path'], glob.job_file)
+    glob.deferred_tasks.append({'config':  copy.deepcopy(glob.config),
+                                'header':  glob.lib.sched.array_header(script_path),
+                                'dep':     glob.lib.sched.get_dep_str(),
+                                'task_id': None})
+    glob.lib.msg.low("Task will be submitted in job array")
+
+
+# Submit deferred tasks, tasks with matching sbatch options share a job array
+def submit_deferred():
+
+    if not glob.deferred_tasks:
+        return
+
+    groups = {}
+    for task in glob.deferred_tasks:
+        groups.setdefault(tuple(task['header'] + [task['dep']]), []).append(task)
+
+    glob.lib.msg.high("Submitting " + str(len(glob.deferred_tasks)) + " tasks in " + str(len(groups)) + " jobs")
+
+    for task_list in groups.values():
+        if len(task_list) > 1:
+            glob.lib.sched.submit_array(task_list, task_list[0]['header'], task_list[0]['dep'], get_job_limit())
+            # Array tasks count toward max_running_jobs of queued tasks
+            glob.lib.sched.add_to_window([task['task_id'] for task in task_list])
+        # Single task
+        else:
+            glob.config = task_list[0]['config']
+            submit_task()
+            task_list[0]['task_id'] = glob.task_id
+
+    # Write bench reports in sweep order
+    for task in glob.deferred_tasks:
+        glob.config = task['config']
+        glob.task_id = task['task_id']
+        finish_task()
+
+    glob.deferred_tasks = []
+
+
 # Main function to check for installed application, setup benchmark and run it
 def run_bench(input_str: str, glob_copy: object) -> int:
 
@@ -268,6 +330,8 @@ def run_bench(input_str: str, glob_copy: object) -> int:
     # Reset dependency lists
     glob.any_dep_list = []
     glob.ok_dep_list = []
+    # Tasks waiting for job array submission
+    glob.deferred_tasks = []
 
     # Convert string to dict
     input_dict = glob.lib.parse_bench_str(input_str)
@@ -325,8 +389,12 @@ def run_bench(input_str: str, glob_copy: object) -> int:
     # Stage input files
     #glob.lib.files.stage()
 
-    glob.prev_task_id = glob.lib.sched.get_active_jobids('_bench')
-    prev_pid = 0
+    # Evaluate expressions which are the same for every point of the sweep once
+    glob.args.build = None
+    glob.sweep_keys = glob.lib.expr.get_sweep_keys(sweep_runtime_keys, glob.stg['exec_mode'] != "local")
+    for sect in sweep_sections:
+        glob.lib.expr.eval_dict(glob.config[sect], True, [key for key in glob.config[sect] if key not in glob.sweep_keys])
+    glob.lib.msg.log("Keys evaluated per sweep point: " + ", ".join(sorted(glob.sweep_keys)))
 
     # Create backup on benchmark cfg params, to be modified by each loop 
     backup_dict = copy.deepcopy(glob.config) 
@@ -365,10 +433,67 @@ def run_bench(input_str: str, glob_copy: object) -> int:
                 glob.lib.files.write_cmd_history()
                 glob.lib.msg.brk()
 
+    # Submit tasks held for job arrays
+    submit_deferred()
+
     # Return number of tasks compeleted for this benchmark 
     return glob.counter
 
 
+# Get application requirements of bench input, None if no application build is needed
+def get_requirements(inp: str, plan_glob: object) -> dict:
+
+    input_dict = plan_glob.lib.parse_bench_str(inp)
+    plan_glob.lib.cfg.ingest('bench', input_dict)
+    plan_glob.lib.generate_requirements(input_dict)
+
+    # Evaluate any expressions in the requirements section
+    plan_glob.lib.expr.eval_dict(plan_glob.config['requirements'], False)
+
+    # Applications selected with task ID are never built
+    if plan_glob.config['requirements']['task_id'] or not plan_glob.lib.needs_code(plan_glob.config['requirements']):
+        return None
+
+    return plan_glob.config['requirements']
+
+
+# Build all applications missing for list of inputs once, before generating bench scripts
+# Bench jobs then get afterok dependencies on the running build jobs from get_app_info()
+def plan_builds(glob: object, input_list: list) -> None:
+
+    builds = {}
+    for inp in input_list:
+        plan_glob = glob.session_copy()
+        # Suppress output
+        plan_glob.stg['verbosity'] = 1
+
+        requirements = get_requirements(inp, plan_glob)
+        if requirements and not plan_glob.lib.check_if_installed(requirements):
+            # Inputs with the same requirements share one build
+            key = tuple(sorted((key, str(value)) for key, value in requirements.items() if value))
+            builds.setdefault(key, copy.deepcopy(requirements))
+
+    if not builds:
+        return
+
+    glob.lib.msg.high("Building " + str(len(builds)) + " missing applications for " + str(len(input_list)) + " benchmarks...")
+
+    # Set build args
+    build_glob = glob.session_copy()
+    build_glob.args.build = list(builds.values())
+    build_glob.args.bench = None
+    build_glob.submitted_jobs = []
+    # Suppress output
+    build_glob.stg['verbosity'] = 1
+
+    # Run build manager
+    build_manager.init(build_glob)
+    glob.submitted_jobs.extend(build_glob.submitted_jobs)
+
+    # Update installed list once for all inputs
+    glob.lib.set_installed_apps()
+
+
 # Check input
 def init(glob: object):
 
@@ -403,16 +528,30 @@ def init(glob: object):
         input_list = glob.suite[glob.args.bench[0]].split(" ")
         glob.lib.msg.high("Running benchmark suite '" + glob.args.bench[0] + "' containing: '" + "', '".join(input_list) + "'")
 
+    # Build missing applications for all inputs at once
+    if glob.stg['build_if_missing']:
+        plan_builds(glob, input_list)
+
     # Run benchmark on list of inputs
     for inp in input_list:
 
         # Get a copy of the global object for use in this benchmark session
-        glob_copy = copy.deepcopy(glob)
+        glob_copy = glob.session_copy()
 
         # Reset stage elems 
         glob_copy.stage_ops = []
+        glob_copy.submitted_jobs = []
 
         # Start benchmark session and collect number of runs
         glob.counter = run_bench(inp, glob_copy)
+        glob.submitted_jobs.extend(glob_copy.submitted_jobs)
+
+    # Submit queued tasks up to max_running_jobs, the rest are released as running tasks finish
+    if not glob.stg['dry_run']:
+        if glob.lib.sched.drain():
+            glob.lib.sched.start_drainer()
+
+    # Print queue state of all submitted jobs at once
+    glob.lib.sched.print_queue(glob.submitted_jobs)
 
 
@@ -170,9 +170,8 @@ def build_code(input_dict: dict, glob_copy: object):
 
         # Or start local shell
         else:
-            glob.lib.proc.start_local_shell()
-            #Store PID for report
-            glob.task_id = glob.prev_pid
+            # Queue task in local executor, store task ID for report
+            glob.task_id = glob.lib.proc.start_local_shell()
 
     # Generate build report
     glob.lib.report.build()
@@ -230,28 +229,33 @@ def init(glob: object):
 
         build_list  = glob.args.build
         # If user input is a suite - get string from user.ini
-        if glob.args.build[0] in glob.suite.keys():
+        if isinstance(glob.args.build[0], str) and glob.args.build[0] in glob.suite.keys():
 
             build_list = glob.stg[glob.args.build[0]].split(" ")
             glob.lib.msg.heading(["Building suite '" + glob.args.build[0] + "': " + ", ".join(build_list), ""])
 
 
-        # User build input (can be ' ' delimited)
+        # User build input (can be ' ' delimited), or requirement dicts from bench planner
         for build_str in build_list:
 
             # Get a copy of the global object for use in this benchmark session
-            glob_copy = copy.deepcopy(glob)
+            glob_copy = glob.session_copy()
 
 
             glob_copy.overload_dict = copy.deepcopy(glob.overload_dict)
+            glob_copy.submitted_jobs = []
 
-            build_code(glob.lib.parse_build_str(build_str), glob_copy)
+            build_code(build_str if isinstance(build_str, dict) else glob.lib.parse_build_str(build_str), glob_copy)
+            glob.submitted_jobs.extend(glob_copy.submitted_jobs)
             glob.lib.msg.brk()
 
+        # Print queue state of all submitted jobs at once
+        glob.lib.sched.print_queue(glob.submitted_jobs)
+
     # ----------------- IF CODE LABEL IS A DICT (FROM BENCHER) --------------------------
     else:
         # Get a copy of the global object for use in this benchmark session
-        glob_copy = copy.deepcopy(glob)
+        glob_copy = glob.session_copy()
 
         # Start build
         build_code(glob.args.build, glob_copy)
@@ -1,5 +1,6 @@
 # System Imports
 import configparser
+import copy
 from datetime import datetime
 import getpass
 import inspect
@@ -290,6 +291,34 @@ class setup(object):
                                             self.ev['BP_RESULTS'], 
                                             self.stg['failed_subdir']
                                             )
+        self.stg['fake_sched_path']     = os.path.join(
+                                            self.ev['BP_HOME'],
+                                            self.stg['fake_sched_dir']
+                                            )
+        self.stg['local_queue_path']    = os.path.join(
+                                            self.ev['BP_HOME'],
+                                            self.stg['local_queue_dir']
+                                            )
+        self.stg['submit_queue_path']   = os.path.join(
+                                            self.ev['BP_HOME'],
+                                            self.stg['submit_queue_file']
+                                            )
+        self.stg['rules_cache_path']    = os.path.join(
+                                            self.ev['BP_HOME'],
+                                            self.stg['rules_cache_file']
+                                            )
+        self.stg['module_cache_path']   = os.path.join(
+                                            self.ev['BP_HOME'],
+                                            self.stg['module_cache_file']
+                                            )
+        self.stg['sched_cache_path']    = os.path.join(
+                                            self.ev['BP_HOME'],
+                                            self.stg['sched_cache_file']
+                                            )
+        self.stg['index_path']          = os.path.join(
+                                            self.ev['BP_HOME'],
+                                            self.stg['index_file']
+                                            )
 #        self.stg['script_path']         =os.path.join(
 #                                            self.ev['BP_HOME'], 
 #                                            self.stg['module_dir']
@@ -380,6 +409,16 @@ class setup(object):
             #self.bp_results +=
 
 
+    # Copy for one build/bench session, replaces deepcopy of whole object
+    # Settings and cfg dicts are copied, function library is rebound to the copy without rerunning handler setup
+    def session_copy(self):
+        session = copy.copy(self)
+        for attr, value in vars(self).items():
+            if attr not in self.shared_attrs:
+                setattr(session, attr, copy.deepcopy(value))
+        session.lib = self.lib.rebind(session)
+        return session
+
     # Initialize the global dicts, settings and libraries
     def __init__(self, args):
 
@@ -419,7 +458,11 @@ class setup(object):
         self.modules                     = {}
         # populated with metadata about installed apps
         self.installed_apps_list         = []
+        # (field, value) -> set of indices in installed_apps_list
+        self.installed_apps_index        = {}
         self.bench_results_list          = []
+        # Attributes shared with session copies: library, logger and on-disk app/result lists
+        self.shared_attrs                = ['lib', 'log', 'installed_apps_list', 'installed_apps_index', 'bench_results_list']
 
         # dict for storing overload key-values
         self.overload_dict               = {}
@@ -427,6 +470,8 @@ class setup(object):
 
         # List of staging command to add to script
         self.stage_ops                   = []
+        # Job IDs submitted this session, for batched queue report
+        self.submitted_jobs              = []
 
         # Init function library
         self.lib = lib.init(self)
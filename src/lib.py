@@ -14,7 +14,9 @@ import src.library.capture_handler      as capture_handler
 import src.library.cfg_handler          as cfg_handler
 import src.library.db_handler           as db_handler
 import src.library.expr_handler         as expr_handler
+import src.library.extract_handler      as extract_handler
 import src.library.file_handler         as file_handler
+import src.library.index_handler        as index_handler
 import src.library.misc_handler         as misc_handler
 import src.library.module_handler       as module_handler
 import src.library.msg_handler          as msg_handler
@@ -36,7 +38,9 @@ class init(object):
         self.cfg      = cfg_handler.init(self.glob)
         self.db       = db_handler.init(self.glob)
         self.expr     = expr_handler.init(self.glob)
+        self.extract  = extract_handler.init(self.glob)
         self.files    = file_handler.init(self.glob)
+        self.index    = index_handler.init(self.glob)
         self.misc     = misc_handler.init(self.glob)
         self.module   = module_handler.init(self.glob)
         self.msg      = msg_handler.init(self.glob)
@@ -48,6 +52,18 @@ class init(object):
         self.template = template_handler.init(self.glob)
         self.version  = version_handler.init(self.glob)
 
+    # Copy of library for session copy of glob, handlers keep their caches but use new glob
+    def rebind(self, glob):
+        session_lib = copy.copy(self)
+        session_lib.glob = glob
+        for name, handler in vars(self).items():
+            if name != 'glob':
+                setattr(session_lib, name, copy.copy(handler))
+                getattr(session_lib, name).glob = glob
+        # Scheduler backend holds its own glob reference, created again on use
+        session_lib.sched.backend = None
+        return session_lib
+
     # Convert string to dtype
     def cast_to(self, var: str, dtype: type):
         try:
@@ -95,20 +111,21 @@ class init(object):
 
         # Reset existing app list
         self.glob.installed_apps_list.clear()
+        self.glob.installed_apps_index.clear()
 
         # For each BP_APPS
         for app_dir in self.glob.bp_apps:
 
-            start = app_dir.count(self.glob.stg['sl'])
+            # Get app paths and reports from application index
+            app_list = self.index.apps(app_dir, self.glob.stg['tree_depth'])
 
-            # Get directory paths
-            app_paths = []
-            self.files.search_tree(app_paths, app_dir, start, start, start + self.glob.stg['tree_depth'])
+            # Get scheduler state of all unfinished builds at once
+            self.sched.bulk_task_status([report['build']['task_id'] for app_path, report, status in app_list
+                                            if report and not status and report['build']['exec_mode'] == "sched"])
 
+            final_status = {}
             # For each app 
-            for app_path in app_paths:
-
-                report = self.glob.lib.report.read(app_path)
+            for app_path, report, status in app_list:
 
                 if not report:
 
@@ -124,11 +141,28 @@ class init(object):
                     continue
 
                 report_dict = report['build']
-                report_dict['status']      = self.glob.lib.sched.get_status_str(app_path)
+
+                # Cached successful status is only valid while exe exists
+                if status == self.glob.success and not self.sched.exe_installed(app_path, report):
+                    final_status[app_path] = None
+                    status = None
+
+                report_dict['status']      = status or self.glob.lib.sched.get_status_str(app_path, report)
+
+                # Successful build status won't change
+                if not status and report_dict['status'] == self.glob.success:
+                    final_status[app_path] = report_dict['status']
 
                 # Add to list on installed app dicts
                 self.glob.installed_apps_list.append(report_dict)
 
+            self.index.set_app_status(final_status)
+
+        # Index installed apps by field and value
+        for idx, app in enumerate(self.glob.installed_apps_list):
+            for key, value in app.items():
+                self.glob.installed_apps_index.setdefault((key, str(value)), set()).add(idx)
+
         # Sort by task_id
         #self.glob.installed_apps_list = sorted(self.glob.installed_apps_list, key=lambda x: x['task_id'], reverse=True)
 
@@ -169,18 +203,23 @@ class init(object):
             for result in copy.deepcopy(search_list):
 
                 # Get job type (sched/local/dry_run)
-                exec_mode = self.report.get_exec_mode("bench", result)
+                report = self.report.read(result)
+                exec_mode = report['bench']['exec_mode'] if report else None
                 complete = False
 
+                # Job wrote completion marker
+                if exec_mode in ["sched", "local"] and self.files.read_marker(result):
+                    complete = True
+
                 # Sched exec type - get status from task_id
-                if exec_mode == "sched":
+                elif exec_mode == "sched":
                     # Get task_id and check it is comeplete, if so append to return list and remove from provided list
-                    task_id = self.report.get_task_id("bench", result)
+                    task_id = report['bench']['task_id']
                     complete = self.sched.check_job_complete(task_id)
                 
                 # Local exec type - get status from PID
                 elif exec_mode == "local":
-                    pid = self.report.get_task_id("bench", result)
+                    pid = report['bench']['task_id']
                     # pid_running=False -> complete=True
                     complete = self.proc.complete(pid)
 
@@ -290,23 +329,20 @@ class init(object):
         return False
 
     def find_matching_apps(self, search_dict):
-        matching_apps = []
-
-
-        # Iterate over each installed application
-        for installed_app_dict in self.glob.installed_apps_list:
-
-            # Assume not a matching app
-            match = False
 
-            # If all values in search dict are present in app_dict, app is a match
-            if all(search_elem in installed_app_dict.values() for search_elem in search_dict.values()):
-                match = True
+        # Start with all installed applications
+        matching_idx = set(range(len(self.glob.installed_apps_list)))
 
-            if match:
-                matching_apps.append(installed_app_dict)
+        # Keep apps with matching value for each search key
+        for key, value in search_dict.items():
+            # Unset requirement matches any app
+            if not value:
+                continue
+            matching_idx &= self.glob.installed_apps_index.get((key, str(value)), set())
+            if not matching_idx:
+                break
 
-        return matching_apps
+        return [self.glob.installed_apps_list[idx] for idx in sorted(matching_idx)]
 
     # Check if search_list returns unique installed application
     def check_if_installed(self, search_dict):
@@ -433,7 +469,7 @@ class init(object):
         app_id.update(str(time.time()).encode('utf-8'))
         return app_id.hexdigest()[:length]
 
-    # Parse all build cfg files into list
+    # Get list of cfg files in each cfg path, cfg files are parsed on search
     def get_cfg_list(self, path_list):
 
 
@@ -450,19 +486,18 @@ class init(object):
             if os.path.isdir(os.path.join(path,self.glob.system['system'])):
                 cfg_files += gb.glob(os.path.join(path, self.glob.system['system'], "*.cfg"))
 
-            # Construct
-            for cfg in cfg_files:
-                cfg_list[idx].append(self.files.read_cfg(cfg))
+            # Sort for stable search order
+            cfg_list[idx] = sorted(cfg_files)
 
             idx += 1
         
         return cfg_list
     
-    # Set a list of build cfg file contents in glob
+    # Set a list of build cfg files in glob
     def set_build_cfg_list(self):
         self.glob.build_cfgs =  self.get_cfg_list(self.glob.stg['build_cfg_path'])
 
-    # Set a list of bench cfg file contents in glob
+    # Set a list of bench cfg files in glob
     def set_bench_cfg_list(self):
         self.glob.bench_cfgs = self.get_cfg_list(self.glob.stg['bench_cfg_path'])
 
@@ -50,6 +50,10 @@ class init(object):
 
         self.glob.lib.msg.log("Capturing " + str(num_results) + " results")
         captured = 0
+
+        # Get nodelists of all scheduler jobs at once
+        self.glob.lib.sched.bulk_nodelist([result.task_id for result in complete_results_list
+                                           if result.success and result.bench['exec_mode'] == "sched"])
         
         # Print heading
         if num_results == 1: self.glob.lib.msg.heading("Starting capture for " + str(num_results) + " new result.")
@@ -31,7 +31,8 @@ class init(object):
         # Iter over all avail cfg files
 
         for avail_cfgs in avail_cfgs_list:
-            for cfg in avail_cfgs:
+            # Get parsed cfgs from index, skipping cfgs that can't match
+            for cfg in self.glob.lib.index.cfgs(avail_cfgs, search_dict):
                 # Iter over all search terms
                 match = True
                 found = False
@@ -1,12 +1,71 @@
 # System Imports
+import ast
+import json
+import operator
 import re
 import os
 import sys
 
+# <<<var>>> reference in cfg value, captured name is kept by re.split
+var_ref = re.compile(r"<<<([^<>]+?)>>>")
+# Escaped operators mark value as arithmetic: '<<<cores_per_node>>> \/ <<<ranks_per_node>>>'
+arith_ops = ['\\+', '\\-', '\\*', '\\/']
+bin_ops = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+           ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow}
+unary_ops = {ast.UAdd: operator.pos, ast.USub: operator.neg, ast.Not: operator.not_}
+cmp_ops = {ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le,
+           ast.Gt: operator.gt, ast.GtE: operator.ge}
+bool_ops = {ast.And: all, ast.Or: any}
+
+# Parsed cfg values shared by all sessions: {value: [segments, arithmetic]}
+parsed_values = {}
+# Evaluated arithmetic: {expression: int}
+arith_results = {}
+# Compiled system rules of this process: {rules_file: [mtime, size, [Rule]]}, ingested rules persist in 'rules_cache_file'
+compiled_rules = {}
+
+# System rule compiled from rules file line: [nodes] >= 3 AND [nodes] < 512 : [queue] = 'normal'
+class Rule(object):
+    def __init__(self, line, ingested: dict = None):
+        self.line = line.strip()
+        # Rules read from rules cache file are already ingested
+        ingested = ingested or self.ingest(self.line)
+
+        self.inputs    = ingested['inputs']
+        self.condition = ingested['condition']
+        self.key       = ingested['key']
+        self.value     = ingested['value']
+        self.tree = ast.parse(self.condition, mode="eval")
+
+        # Memoized condition results: {input values: bool}
+        self.results = {}
+
+    # Split rule line into input keys, condition expression, key to update and new value
+    @staticmethod
+    def ingest(line: str) -> dict:
+        condition, action = line.split(":", 1)
+        condition = condition.replace("AND", "and").replace("OR", "or").replace('"', "'")
+
+        # Input keys, quoted '[key]' is compared as string, [key] as value from search space
+        inputs = list(dict.fromkeys(re.findall(r"\[(.*?)\]", condition)))
+        for idx, key in enumerate(inputs):
+            condition = condition.replace("'[" + key + "]'", "_str" + str(idx)).replace("[" + key + "]", "_val" + str(idx))
+
+        return {'inputs':       inputs,
+                'condition':    condition.strip(),
+                'key':          re.search(r"\[(.*?)\]", action).group(1),
+                'value':        action.split("=", 1)[1].strip().replace('"', '').replace("'", "")}
+
+    # Ingested rule for rules cache file
+    def to_dict(self) -> dict:
+        return {'line': self.line, 'inputs': self.inputs, 'condition': self.condition, 'key': self.key, 'value': self.value}
+
 class init(object):
     def __init__(self, glob):
         self.glob = glob
         self.search_space = []
+        # key: first dict in search space containing key
+        self.owners = {}
 
     # Sets the dicts to search for matching keys, depending on build/bench operation
     def set_search_space(self):
@@ -26,22 +85,65 @@ class init(object):
                                         self.glob.sched['sched'], 
                                         self.glob.system]
 
+        self.owners = {}
+
+    # Parse cfg value once into [segments, arithmetic], odd segments are variable names
+    def parse(self, value):
+        value = str(value)
+        if value not in parsed_values:
+            parsed_values[value] = [var_ref.split(value), any(op in value for op in arith_ops)]
+        return parsed_values[value]
+
+    # Get variable names referenced by value
+    def get_deps(self, value):
+        return self.parse(value)[0][1::2]
+
     # Return True if operators are found in string
     def has_arithmatic(self, expr):
-        matching_ops = ['\+', '\-', '\*', '\/', '\**']
-        if any(op in str(expr) for op in matching_ops):
+        return self.parse(expr)[1]
+
+    # Evaluate syntax tree of arithmetic or rule condition, only constants, names from rule inputs,
+    # arithmetic, comparison and boolean operators are allowed
+    def eval_node(self, node, names={}):
+        if isinstance(node, ast.Expression):
+            return self.eval_node(node.body, names)
+        if isinstance(node, ast.Constant) and type(node.value) in [int, float, str]:
+            return node.value
+        if isinstance(node, ast.Name) and node.id in names:
+            return names[node.id]
+        if isinstance(node, ast.UnaryOp) and type(node.op) in unary_ops:
+            return unary_ops[type(node.op)](self.eval_node(node.operand, names))
+        if isinstance(node, ast.BinOp) and type(node.op) in bin_ops:
+            left, right = self.eval_node(node.left, names), self.eval_node(node.right, names)
+            if not all(type(val) in [int, float] for val in [left, right]):
+                raise ValueError("arithmetic on non-number")
+            # Avoid huge powers
+            if isinstance(node.op, ast.Pow) and abs(right) > 64:
+                raise ValueError("exponent too large")
+            return bin_ops[type(node.op)](left, right)
+        if isinstance(node, ast.BoolOp) and type(node.op) in bool_ops:
+            return bool_ops[type(node.op)](self.eval_node(value, names) for value in node.values)
+        if isinstance(node, ast.Compare) and all(type(op) in cmp_ops for op in node.ops):
+            left = self.eval_node(node.left, names)
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self.eval_node(comparator, names)
+                if not cmp_ops[type(op)](left, right):
+                    return False
+                left = right
             return True
-        else:
-            return False
+        raise ValueError("unsupported expression element")
 
     # Evaulate arithamtic in string 
     def evaluate_arithmatic(self, expr):
 
-        self.glob.lib.msg.log("Evaluating arithmatic: " + str(expr) )
-        try:
-            return int(eval(expr.replace("\\", "")))
-        except:
-            self.glob.lib.msg.error("failed to evaulate artimatic expression '" + expr + "'")
+        expr = expr.replace("\\", "").strip()
+        if expr not in arith_results:
+            self.glob.lib.msg.log("Evaluating arithmatic: " + str(expr) )
+            try:
+                arith_results[expr] = int(self.eval_node(ast.parse(expr, mode="eval")))
+            except (SyntaxError, ValueError, TypeError, ZeroDivisionError, OverflowError, RecursionError):
+                self.glob.lib.msg.error("failed to evaulate artimatic expression '" + expr + "'")
+        return arith_results[expr]
 
     # Find matching key in dict and return value, or return False 
     def find_key(self, key, search_dict):
@@ -52,61 +154,76 @@ class init(object):
         else:
             return False, ""
 
+    # Get dict in search space which resolves key, first dict containing key
+    def get_owner(self, key):
+        if key not in self.owners:
+            for search_dict in self.search_space:
+                if search_dict and key in search_dict:
+                    self.owners[key] = search_dict
+                    break
+        return self.owners.get(key)
+
     # Look for key in multiple dicts, return value or error
     def get_dict_value(self, key):
 
-        # For each dict in list
-        for search_dict in self.search_space:
-            if search_dict:
-                # Look for key in dict
-                matched, value = self.find_key(key, search_dict)
-                if matched:
-                    # Cast to int
-                    try:
-                        return int(value)
-                    # Return str
-                    except:
-                        return value 
-
+        owner = self.get_owner(key)
         # No match found in search space
-        self.glob.lib.msg.error("Unable to resolve variable '" + key + "'")
+        if owner is None or key not in owner:
+            self.glob.lib.msg.error("Unable to resolve variable '" + key + "'")
+
+        # Cast to int
+        try:
+            return int(owner[key])
+        # Return str
+        except:
+            return owner[key]
 
     # Replace variables
     def resolve_vars(self, dict_value, runtime_keys):
-        # Get list of <<<variables>>>
 
-        var_list = re.findall('\<<<([^>>>]+)',str(dict_value))
+        segments = self.parse(dict_value)[0]
+        # No variables
+        if len(segments) == 1:
+            return dict_value
 
-        # For each found variable
-        for var in var_list:
+        resolved = segments[0]
+        for idx in range(1, len(segments), 2):
+            resolved += str(self.get_dict_value(segments[idx])) + segments[idx + 1]
+        self.glob.lib.msg.log("Resolved '" + str(dict_value) + "' to '" + resolved + "'")
 
-            # Skip runtime keys for now
-            #if runtime_keys and (var in runtime_keys):
-            #    break 
+        return resolved
 
-            new_value = str(self.get_dict_value(var))
-            dict_value = dict_value.replace("<<<" + var + ">>>", new_value)
-            self.glob.lib.msg.log("Replacing <<<" + var + ">>> with " + new_value)
+    # Evaluate key after the keys of the same dict it refers to, dependency graph walked depth first
+    def eval_key(self, cfg_dict, key, key_set, done, path):
 
-        return dict_value
+        if key in done:
+            return
+        if key in path:
+            self.glob.lib.msg.error("Circular reference between variables: " + " > ".join(path + [key]))
 
-    # Check dict for vars, resolve them and then evaluate for arithmatic
-    def eval_dict(self, cfg_dict, eval_runtime_vars):
+        for dep in self.get_deps(cfg_dict[key]):
+            if dep in key_set and self.get_owner(dep) is cfg_dict:
+                self.eval_key(cfg_dict, dep, key_set, done, path + [key])
 
-        self.set_search_space()
+        # Resolve variables
+        cfg_dict[key] = self.resolve_vars(cfg_dict[key], None)
 
-        runtime_keys = None
-        if eval_runtime_vars:
-            runtime_keys = self.glob.config['runtime'].keys()
+        # If operators are present
+        if self.has_arithmatic(cfg_dict[key]):
+            cfg_dict[key] = str(self.evaluate_arithmatic(cfg_dict[key]))
 
-        for key in cfg_dict:
+        done.add(key)
+
+    # Check dict for vars, resolve them and then evaluate for arithmatic, only keys in key_list if provided
+    def eval_dict(self, cfg_dict, eval_runtime_vars, key_list=None):
+
+        self.set_search_space()
 
-            # Resolve variables
-            cfg_dict[key] = self.resolve_vars(cfg_dict[key], runtime_keys) 
-            
-            # If operators are present
-            if self.has_arithmatic(cfg_dict[key]):
-                cfg_dict[key] = str(self.evaluate_arithmatic(cfg_dict[key]))
+        key_set = set(key for key in cfg_dict if key_list is None or key in key_list)
+        done = set()
+        for key in cfg_dict:
+            if key in key_set:
+                self.eval_key(cfg_dict, key, key_set, done, [])
 
     # Get key from string
     def extract_key(self, expr):
@@ -122,72 +239,129 @@ class init(object):
     def get_value(self, expr):
        return expr.split("=")[1].strip()
 
-    # Evaluate logical expression
-    def eval_logic_expr(self, expr):
-
-        self.glob.lib.msg.log("Evaluating logical " +  str(expr))
-        try:
-            return eval(expr)
-        except:
-            self.glob.lib.msg.error("Unable to eval " + expr)
-
-    # Replace variable in condition with existing value from search space, then evaluate expression
-    def eval_cond(self, cond):
-        key = self.extract_key(cond)
-        return self.eval_logic_expr(self.replace_key(cond, key, self.get_dict_value(key)))
+    # Evaluate compiled rule condition with current values of its input keys, memoized on input values
+    def eval_rule(self, rule):
 
-    # Update dict value with rule value
-    def apply_rule(self, action):
-        key = self.extract_key(action)
-        value = action.split("=")[1].strip().replace('"', '').replace("'", "")
+        values = tuple(self.get_dict_value(key) for key in rule.inputs)
+        values = tuple(value[0] if isinstance(value, list) else value for value in values)
+        if values not in rule.results:
+            self.glob.lib.msg.log("Evaluating rule: " + rule.line)
+            names = {}
+            for idx, value in enumerate(values):
+                names["_val" + str(idx)] = value
+                names["_str" + str(idx)] = str(value)
+            try:
+                rule.results[values] = bool(self.eval_node(rule.tree, names))
+            except (ValueError, TypeError, ZeroDivisionError, OverflowError, RecursionError):
+                self.glob.lib.msg.error("Unable to eval rule '" + rule.line + "'")
+        return rule.results[values]
+
+    # Update dict value with rule value, returns True if applied
+    def apply_rule(self, rule):
+        key, value = rule.key, rule.value
    
         # If this value has already been overloaded_dict - don't change it a 2nd time (rules < user_overload)
         if key in self.glob.overloaded_dict.keys():
             self.glob.lib.msg.low("Skipping conflicting system rule: " + key + "='" + value + "'")
-            return
+            return False
 
         # Search dicts for matching key
         for search_dict in self.search_space:
             if key in search_dict.keys():
-                self.glob.lib.msg.low("Applying system rule: " + key + " '" + search_dict[key] + "' > '" + value + "'")
+                self.glob.lib.msg.low("Applying system rule: " + key + " '" + str(search_dict[key]) + "' > '" + value + "'")
                 search_dict[key] = value
-                return
+                return True
         # No existing key found
         self.glob.lib.msg.error("No existing parameter found matching '" + key + "' from rules file.")
 
-    # Evaluate a rule's condition, apply updates 
-    def eval_rule(self, rule):
-
-        self.glob.lib.msg.log("Evaluating rule: " + str(rule))
-
-        rule = rule.replace("AND", "and")
-        rule = rule.replace("OR", "or")
-        condition = rule.split(":")[0].replace('"', '\'')
-        action = rule.split(":")[1].replace('"', '\'')
-
-        # Badly formatted rule
-        if not condition or not action:
-            self.glob.lib.msg.error("Rule formatting error in '" + rule + "'")
+    # Get path to rules file for this system
+    def get_rules_file(self):
+        return os.path.join(self.glob.stg['rules_path'], self.glob.system['system']+".cfg")
+
+    # Get compiled rules from file, compiled again only if file was modified
+    def get_rules(self, rules_file):
+        stat = os.stat(rules_file)
+        cached = compiled_rules.get(rules_file)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        # Rules ingested by previous invocation
+        rules_cache = self.read_rules_cache()
+        entry = rules_cache.get(rules_file)
+        rules = None
+        if entry and entry.get('mtime') == stat.st_mtime_ns and entry.get('size') == stat.st_size:
+            try:
+                rules = [Rule(rule['line'], rule) for rule in entry['rules']]
+            except (KeyError, TypeError, SyntaxError):
+                rules = None
+
+        if rules is None:
+            self.glob.lib.msg.log("Compiling rules file " + rules_file)
+            rules = []
+            for line in self.glob.lib.files.read(rules_file):
+                # Skip blank lines and comments
+                if not line.strip() or line.strip().startswith("#"):
+                    continue
+                try:
+                    rules.append(Rule(line))
+                except (ValueError, SyntaxError, IndexError, AttributeError):
+                    self.glob.lib.msg.error("Rule formatting error in '" + line.strip() + "'")
+
+            rules_cache[rules_file] = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'rules': [rule.to_dict() for rule in rules]}
+            self.write_rules_cache(rules_cache)
+
+        compiled_rules[rules_file] = [stat.st_mtime_ns, stat.st_size, rules]
+        return rules
+
+    # Read rules cache file: {rules_file: {'mtime', 'size', 'rules': [ingested rule]}}
+    def read_rules_cache(self) -> dict:
+        try:
+            with open(self.glob.stg['rules_cache_path']) as fp:
+                cache = json.load(fp)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    # Write rules cache file via tmp file
+    def write_rules_cache(self, cache: dict) -> None:
+        tmp_file = self.glob.stg['rules_cache_path'] + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(tmp_file, "w") as fp:
+                json.dump(cache, fp)
+            os.replace(tmp_file, self.glob.stg['rules_cache_path'])
+        except OSError as err:
+            self.glob.lib.msg.log("Unable to write rules cache: " + str(err))
+
+    # Get keys which system rules may update
+    def get_rule_keys(self):
+        rules_file = self.get_rules_file()
+        if not self.glob.stg['apply_system_rules'] or not os.path.isfile(rules_file):
+            return set()
+        return set(rule.key for rule in self.get_rules(rules_file))
+
+    # Get keys whose value can differ between points of a bench sweep:
+    # swept runtime keys, keys updated by system rules, and any key whose value refers to one of these
+    def get_sweep_keys(self, sweep_keys, apply_rules):
 
-        conditions = []
-        #check for AND
-        if "and" in condition:
-            conditions.extend(condition.split(" and "))
-        #check for OR
-        elif "or" in condition:
-            conditions.extend(condition.split(" or "))
-        else:
-            conditions = [condition]
+        self.set_search_space()
+        sweep_keys = set(sweep_keys)
+        if apply_rules:
+            sweep_keys |= self.get_rule_keys()
 
-        # Evaluate each condition
-        for cond in conditions:
-            condition = condition.replace(cond, str(self.eval_cond(cond)))
+        # Dependency graph of keys in search space
+        deps = {}
+        for search_dict in self.search_space:
+            for key in search_dict or {}:
+                deps.setdefault(key, set()).update(self.get_deps(search_dict[key]))
 
-        # Evaluate whole expression 
-        if self.eval_logic_expr(condition):
-            self.apply_rule(action)
+        # Add keys referring to sweep keys until no more are found
+        while True:
+            new_keys = set(key for key in deps if key not in sweep_keys and deps[key] & sweep_keys)
+            if not new_keys:
+                return sweep_keys
+            sweep_keys |= new_keys
 
-    # Apply system rules
+    # Apply system rules, fired rules are stored in metadata for bench/build report
     def apply_system_rules(self):
 
         # Skip applying system rules
@@ -195,21 +369,20 @@ class init(object):
             return
 
         # Rules file for this system
-        rules_file = os.path.join(self.glob.stg['rules_path'], self.glob.system['system']+".cfg")
+        rules_file = self.get_rules_file()
 
         # System rules file exists
         if os.path.isfile(rules_file):
 
             # Set variable search space
             self.set_search_space()
-            
-            # Read rules from file
-            rules = self.glob.lib.files.read(rules_file)  
 
             # Evaluate each rule
-            for line in rules:
-                self.eval_rule(line)
+            fired = []
+            for rule in self.get_rules(rules_file):
+                if self.eval_rule(rule) and self.apply_rule(rule):
+                    fired.append(rule.line)
+            self.glob.config['metadata']['rules_fired'] = fired
 
         else:
             self.glob.lib.msg.log("No " + self.glob.system['system'] + " rules file  found:" + rules_file)
-
@@ -0,0 +1,309 @@
+# System Imports
+from collections import deque
+from itertools import islice
+import re
+from typing import Callable, Iterator, List
+
+# Shell characters which trigger expansion or redirection, not translated
+shell_chars = "$`\\;&<>()*?[]~!#"
+
+# awk default field separator
+awk_fs = re.compile("[ \t]+")
+
+class init(object):
+    def __init__(self, glob):
+        self.glob = glob
+        # Compiled pipelines: expr -> list of stages, or False if not translatable
+        self.compiled = {}
+
+    # Split shell expression into list of commands, each a list of words
+    # Returns None if expression uses shell features beyond quoting and pipes
+    def tokenize(self, expr: str) -> List[list]:
+        placeholder = "[output_file]"
+        stages = [[]]
+        word = ""
+        in_word = False
+        quote = None
+        brace = comma = False
+
+        idx = 0
+        while idx < len(expr):
+            char = expr[idx]
+            idx += 1
+
+            # Inside quotes
+            if quote:
+                if char == quote:
+                    quote = None
+                elif quote == '"' and char in "$`\\":
+                    return None
+                else:
+                    word += char
+                continue
+
+            if char in "'\"":
+                quote = char
+                in_word = True
+
+            # Output file placeholder
+            elif expr.startswith(placeholder, idx - 1):
+                word += placeholder
+                in_word = True
+                idx += len(placeholder) - 1
+
+            elif char.isspace() or char == "|":
+                if in_word:
+                    # Brace expansion
+                    if brace and comma:
+                        return None
+                    stages[-1].append(word)
+                word = ""
+                in_word = brace = comma = False
+                if char == "|":
+                    if not stages[-1]:
+                        return None
+                    stages.append([])
+
+            elif char in shell_chars:
+                return None
+
+            else:
+                brace = brace or char in "{}"
+                comma = comma or char == ","
+                word += char
+                in_word = True
+
+        # Unterminated quote
+        if quote:
+            return None
+        if in_word:
+            if brace and comma:
+                return None
+            stages[-1].append(word)
+        if not stages[-1]:
+            return None
+
+        return stages
+
+    # Convert grep basic regex to Python regex, None if not supported
+    def convert_bre(self, pattern: str) -> str:
+        # Escapes and POSIX classes have different meanings
+        if "\\" in pattern or "[:" in pattern:
+            return None
+        # These are literal in BRE
+        for char in "+?(){}|":
+            pattern = pattern.replace(char, "\\" + char)
+        # Leading * is literal
+        if pattern.startswith("*"):
+            pattern = "\\" + pattern
+        elif pattern.startswith("^*"):
+            pattern = "^\\" + pattern[1:]
+        try:
+            return re.compile(pattern)
+        except re.error:
+            return None
+
+    # Parse line count argument of head/tail
+    def parse_count(self, args: list) -> list:
+        count = 10
+        remain = []
+        while args:
+            arg = args.pop(0)
+            if arg == "-n" and args:
+                arg = "-n" + args.pop(0)
+            if arg.startswith("-n"):
+                arg = arg[2:]
+            elif arg.startswith("-"):
+                arg = arg[1:]
+            else:
+                remain.append(arg)
+                continue
+            if not arg.isdigit():
+                return None
+            count = int(arg)
+        return [count, remain]
+
+    # Parse cut field list, eg. 2 or 1,3 or 2-4 or 3-
+    def parse_fields(self, field_list: str) -> Callable:
+        ranges = []
+        for item in field_list.split(","):
+            bounds = item.split("-")
+            if len(bounds) > 2 or not all(bound.isdigit() or not bound for bound in bounds) or not any(bounds):
+                return None
+            start = int(bounds[0]) if bounds[0] else 1
+            end = (int(bounds[-1]) if bounds[-1] else None) if len(bounds) == 2 else start
+            if start < 1:
+                return None
+            ranges.append([start, end])
+
+        return lambda idx: any(start <= idx and (end is None or idx <= end) for start, end in ranges)
+
+    def compile_grep(self, args: list) -> list:
+        invert = ignore = False
+        while args and args[0].startswith("-") and len(args[0]) > 1:
+            flag = args.pop(0)
+            if flag == "-v":
+                invert = True
+            elif flag == "-i":
+                ignore = True
+            else:
+                return None
+        if not args:
+            return None
+
+        pattern = args.pop(0)
+        regex = self.convert_bre(pattern)
+        if not regex:
+            return None
+        if ignore:
+            regex = re.compile(regex.pattern, re.IGNORECASE)
+
+        def match(line: str) -> bool:
+            return bool(regex.search(line)) != invert
+
+        def stage(lines: Iterator[str]) -> Iterator[str]:
+            return (line for line in lines if match(line))
+        return [stage, args, match]
+
+    def compile_tail(self, args: list) -> list:
+        parsed = self.parse_count(args)
+        if not parsed:
+            return None
+        count, args = parsed
+
+        def stage(lines: Iterator[str]) -> Iterator[str]:
+            return iter(deque(lines, maxlen=count)) if count else iter([])
+        return [stage, args, count]
+
+    def compile_head(self, args: list) -> list:
+        parsed = self.parse_count(args)
+        if not parsed:
+            return None
+        count, args = parsed
+
+        def stage(lines: Iterator[str]) -> Iterator[str]:
+            return islice(lines, count)
+        return [stage, args, count]
+
+    def compile_cut(self, args: list) -> list:
+        delim = "\t"
+        select = None
+        remain = []
+        while args:
+            arg = args.pop(0)
+            if arg in ["-d", "-f"] and args:
+                arg = arg + args.pop(0)
+            if arg.startswith("-d"):
+                delim = arg[2:]
+            elif arg.startswith("-f"):
+                select = self.parse_fields(arg[2:])
+            elif arg.startswith("-"):
+                return None
+            else:
+                remain.append(arg)
+
+        if len(delim) != 1 or not select:
+            return None
+
+        def stage(lines: Iterator[str]) -> Iterator[str]:
+            for line in lines:
+                # Lines without delimiter are printed unchanged
+                if delim not in line:
+                    yield line
+                else:
+                    yield delim.join(field for idx, field in enumerate(line.split(delim), 1) if select(idx))
+        return [stage, remain, None]
+
+    def compile_awk(self, args: list) -> list:
+        if not args:
+            return None
+        # Only '{print $N, ...}' programs
+        program = re.match(r"^\s*\{\s*print\s+(\$(?:\d+|NF)(?:\s*,\s*\$(?:\d+|NF))*)\s*;?\s*\}\s*$", args.pop(0))
+        if not program:
+            return None
+        columns = [col.strip()[1:] for col in program.group(1).split(",")]
+
+        def field(fields: list, line: str, col: str) -> str:
+            if col == "NF":
+                return fields[-1] if fields else ""
+            idx = int(col)
+            if idx == 0:
+                return line
+            return fields[idx - 1] if idx <= len(fields) else ""
+
+        def stage(lines: Iterator[str]) -> Iterator[str]:
+            for line in lines:
+                fields = [elem for elem in awk_fs.split(line) if elem]
+                yield " ".join(field(fields, line, col) for col in columns)
+        return [stage, args, None]
+
+    def compile_rev(self, args: list) -> list:
+        def stage(lines: Iterator[str]) -> Iterator[str]:
+            return (line[::-1] for line in lines)
+        return [stage, args, None]
+
+    def compile_cat(self, args: list) -> list:
+        def stage(lines: Iterator[str]) -> Iterator[str]:
+            return lines
+        return [stage, args, None]
+
+    # Translate expression into list of stages, or None if not supported
+    def translate(self, expr: str) -> list:
+        commands = self.tokenize(expr)
+        if not commands:
+            return None
+
+        stages = []
+        for idx, command in enumerate(commands):
+            name = command[0]
+            if not hasattr(self, "compile_" + name):
+                return None
+
+            compiled = getattr(self, "compile_" + name)(command[1:])
+            if not compiled:
+                return None
+            stage, files, param = compiled
+
+            # First command reads output file, the rest read pipe
+            if files != (["[output_file]"] if idx == 0 else []):
+                return None
+
+            stages.append([name, stage, param])
+        return stages
+
+    # Return compiled pipeline for expression, None if shell is required
+    def compile(self, expr: str) -> list:
+        if expr not in self.compiled:
+            self.compiled[expr] = self.translate(expr) or False
+            if not self.compiled[expr]:
+                self.glob.lib.msg.log("Unable to evaluate '" + expr + "' natively, using shell")
+        return self.compiled[expr] or None
+
+    # Run pipeline on output file, returns stripped stdout or None if pipeline failed
+    def run(self, stages: list, output_path: str) -> str:
+        try:
+            # grep | tail -n N only needs end of file, search backwards
+            if len(stages) > 1 and stages[0][0] == "grep" and stages[1][0] == "tail":
+                match, count = stages[0][2], stages[1][2]
+                matched = (line for line in self.glob.lib.files.reverse_lines(output_path) if match(line))
+                lines = iter(list(islice(matched, count))[::-1])
+                for name, stage, param in stages[2:]:
+                    lines = stage(lines)
+                output = list(lines)
+
+            else:
+                with open(output_path, errors="replace") as fp:
+                    lines = (line.rstrip("\n") for line in fp)
+                    for name, stage, param in stages:
+                        lines = stage(lines)
+                    output = list(lines)
+
+        except OSError as err:
+            self.glob.lib.msg.log("Unable to read " + output_path + ": " + str(err))
+            return None
+
+        # grep exits non-zero when nothing matched
+        if stages[-1][0] == "grep" and not output:
+            return None
+
+        return "\n".join(output).strip()
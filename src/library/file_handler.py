@@ -3,13 +3,16 @@ import cgi
 import configparser as cp
 from ftplib import FTP
 import glob as gb
+import hashlib
+from itertools import islice
+import json
 import os
 import pwd
 import shutil as su
 import sys
 import tarfile
 import time
-from typing import List
+from typing import Iterator, List
 from urllib.request import urlopen
 from urllib.request import urlretrieve
 
@@ -19,6 +22,8 @@ from src.modules import Result
 class init(object):
     def __init__(self, glob):
         self.glob = glob
+        # Format version of .cache record
+        self.cache_version = 2
 
     # Read non-cfg file into list
     def read(self, file_path):
@@ -567,8 +572,13 @@ class init(object):
             self.glob.lib.msg.warn("Result directory already exists in archive. Appending suffix .dup")
             # Rename result dir
             su.move(result_path, result_path + ".dup")
+            self.glob.lib.index.drop_result(result_path)
             # Try again
             self.move_to_archive(result_path + ".dup", dest)
+            return
+
+        # Update results index
+        self.glob.lib.index.move_result(result_path, os.path.join(dest, os.path.basename(os.path.normpath(result_path))))
 
 
     def copy_prov_data(self, record: Result, dest_dir: str):#file_list: List[str], src: str, dest: str) -> None:
@@ -615,71 +625,194 @@ class init(object):
 
 
     # Return timestamp from file
-    def get_timestamp(self, keyword: str, search_file: str) -> str:
+    # Yield lines of file from last to first, reading blocks back from end of file
+    def reverse_lines(self, file_path: str, block: int = 65536) -> Iterator[str]:
+        with open(file_path, 'rb') as fp:
+            size = pos = fp.seek(0, os.SEEK_END)
+            partial = b""
+            last = True
+            while pos > 0:
+                step = min(block, pos)
+                pos -= step
+                fp.seek(pos)
+                lines = (fp.read(step) + partial).split(b"\n")
+                # First line may continue in previous block
+                partial = lines.pop(0)
+                for line in reversed(lines):
+                    # Skip empty string after trailing newline
+                    if last and not line:
+                        last = False
+                        continue
+                    last = False
+                    yield line.decode(errors="replace")
+            if size:
+                yield partial.decode(errors="replace")
+
+
+    # Return last lines of file without reading all of it
+    def tail(self, file_path: str, count: int) -> List[str]:
+        return list(islice(self.reverse_lines(file_path), count))[::-1]
+
+
+    # Get timestamp line from file, END line is searched for from end of file
+    def get_timestamp(self, keyword: str, file_path: str) -> str:
+
+        if keyword == "END":
+            lines = self.reverse_lines(file_path)
+        else:
+            lines = open(file_path, errors="replace")
 
         # Search for item line and return in
-        for line in search_file:
-            if line.startswith(keyword):
-                return line
+        try:
+            for line in lines:
+                if line.startswith(keyword):
+                    return line.rstrip("\n")
+        finally:
+            lines.close()
 
         # Time line not found
         return None
 
 
+    # Hash file size with first and last blocks, avoids reading large output files
+    def sample_hash(self, file_path: str, block: int = 65536) -> str:
+        sha = hashlib.sha1()
+        with open(file_path, 'rb') as fp:
+            size = os.fstat(fp.fileno()).st_size
+            sha.update(str(size).encode())
+            sha.update(fp.read(block))
+            if size > block:
+                fp.seek(max(block, size - block))
+                sha.update(fp.read(block))
+        return sha.hexdigest()
+
+
+    # Return size, mtime and hash of result output file
+    def output_stat(self, output_path: str) -> dict:
+        try:
+            stat = os.stat(output_path)
+            return {'output_size':  stat.st_size,
+                    'output_mtime': stat.st_mtime_ns,
+                    'output_hash':  self.sample_hash(output_path)}
+        except (OSError, TypeError):
+            return {'output_size': None, 'output_mtime': None, 'output_hash': None}
+
+
+    # Write result status and value to .cache record
     def cache(self, record: Result) -> None:
 
         # Only cache completed benchmarks
-        if record.complete:
-            cache_file = os.path.join(record.path, ".cache")
+        if not record.complete:
+            return
 
-            # Don't cache twice
-            if os.path.isfile(cache_file):
-                return
+        # Don't rewrite valid cache
+        if record.cached:
+            return
 
-            self.glob.lib.msg.log("Caching '" + str(record.value) + "' to " + cache_file)
-            with open(cache_file, "a") as fp:
-                fp.write("status = " + str(record.status) + "\n")
-                fp.write("result = " + str(record.value) + "\n")
+        cache_file = os.path.join(record.path, ".cache")
 
+        cache = {'version':     self.cache_version,
+                 'status':      record.status,
+                 'value':       record.value,
+                 'unit':        record.unit,
+                 'extracted':   time.strftime("%Y-%m-%d %H:%M:%S"),
+                 'output_file': os.path.relpath(record.output_path, record.path) if record.output_path \
+                                    else record.result['output_file']}
+        cache.update(self.output_stat(record.output_path))
 
-    def read_cache(self, cache_path: str, key: str) -> None:
-        cache_file = os.path.join(cache_path, ".cache")
-        if os.path.isfile(cache_file):
-            cache = self.read(cache_file)
-            for line in cache:
-                if line.startswith(key):
-                    value = line.split("=")[1].strip()
-                    try:
-                        value = float(value)
-                        return value
-                    except:
-                        return value
-        return None
+        self.glob.lib.msg.log("Caching '" + str(record.value) + "' to " + cache_file)
+
+        # Write to tmp file and rename, readers never see partial record
+        tmp_file = cache_file + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(tmp_file, "w") as fp:
+                json.dump(cache, fp)
+            os.replace(tmp_file, cache_file)
+        except OSError as err:
+            self.glob.lib.msg.log("Unable to write " + cache_file + ": " + str(err))
 
 
-    # Read result from .cache
-    def decache_result(self, path: str) -> float:
-        result = self.read_cache(path, "result")
-        # Cast to float
+    # Read .cache record, None if missing, partial or old format
+    def read_cache(self, cache_path: str) -> dict:
+        cache_file = os.path.join(cache_path, ".cache")
+        if not os.path.isfile(cache_file):
+            return None
+
         try:
-            result = float(result)
-        except:
+            with open(cache_file) as fp:
+                cache = json.load(fp)
+        except (OSError, ValueError):
+            self.glob.lib.msg.log("Ignoring unreadable cache " + cache_file)
             return None
 
-        # Result != 0.0
-        if result:
-            self.glob.lib.msg.log("Read " + str(result) + " from " + path)
-            return result
+        if not isinstance(cache, dict) or cache.get('version') != self.cache_version or \
+                not all(key in cache for key in ['status', 'value', 'output_file', 'output_size', 'output_mtime', 'output_hash']):
+            self.glob.lib.msg.log("Ignoring outdated cache " + cache_file)
+            return None
 
-        self.glob.lib.msg.log("No cached result in " + path)
-        return None
+        return cache
+
+
+    # Check result output file is unchanged since result was cached
+    def cache_fresh(self, path: str, cache: dict) -> bool:
+        output_path = os.path.join(path, cache['output_file']) if cache['output_file'] else None
+        try:
+            stat = os.stat(output_path)
+        except (OSError, TypeError):
+            # Output file still missing
+            return cache['output_size'] is None
+
+        if cache['output_size'] is None:
+            return False
+
+        # Same size and mtime
+        if stat.st_size == cache['output_size'] and stat.st_mtime_ns == cache['output_mtime']:
+            return True
+
+        # Touched but same content
+        return stat.st_size == cache['output_size'] and self.sample_hash(output_path) == cache['output_hash']
+
+
+    # Read result from .cache, returns [hit, value]
+    def decache_result(self, path: str) -> list:
+        cache = self.read_cache(path)
+        if not cache:
+            self.glob.lib.msg.log("No cached result in " + path)
+            return [False, None]
+
+        if not self.cache_fresh(path, cache):
+            self.glob.lib.msg.log("Output file changed since result was cached in " + path)
+            return [False, None]
+
+        self.glob.lib.msg.log("Read " + str(cache['value']) + " from " + path)
+        return [True, cache['value']]
 
     # Read status from .cache
     def decache_status(self, path:str) -> str:
-        status = self.read_cache(path, "status")
+        cache = self.read_cache(path)
+        status = cache['status'] if cache else None
         self.glob.lib.msg.log("Read " + str(status) + " from " + path)
         return status
 
+    # Read completion marker written by bench script epilog, None if job hasn't finished
+    def read_marker(self, path: str) -> dict:
+        marker_file = os.path.join(path, self.glob.stg['complete_file'])
+        try:
+            with open(marker_file) as fp:
+                marker = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self.glob.lib.msg.log("Ignoring unreadable completion marker " + marker_file)
+            return None
+
+        if not isinstance(marker, dict) or 'status' not in marker:
+            return None
+        # Status from exit code of application
+        if marker.get('exit_code'):
+            marker['status'] = "FAILED"
+        return marker
+
     # Remove directory
     def delete_dir(self, path: str) -> None:
 
@@ -0,0 +1,279 @@
+# System Imports
+from contextlib import closing
+import json
+import os
+import sqlite3
+from typing import List
+
+class init(object):
+    def __init__(self, glob):
+        self.glob = glob
+        # cfg keys indexed for search
+        self.cfg_lookup_keys = ['code', 'version', 'build_label', 'bench_label', 'dataset']
+        # Set False if the index file can't be used, fall back to scanning directories
+        self.enabled = True
+
+    # Check if index is enabled in user.ini and usable
+    def active(self) -> bool:
+        return self.enabled and self.glob.stg['use_index']
+
+    # Stop using index for this session
+    def disable(self, err) -> None:
+        self.glob.lib.msg.log("Disabling index " + self.glob.stg['index_path'] + ": " + str(err))
+        self.enabled = False
+
+    # Open index file, create tables if missing
+    def connect(self):
+        conn = sqlite3.connect(self.glob.stg['index_path'], timeout=30)
+        conn.execute("CREATE TABLE IF NOT EXISTS results (path TEXT PRIMARY KEY, state TEXT, mtime INTEGER, report TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS apps (path TEXT PRIMARY KEY, mtime INTEGER, report TEXT, status TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS app_dirs (path TEXT PRIMARY KEY, mtime INTEGER, children TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cfgs (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, cfg TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cfg_keys (path TEXT, key TEXT, value TEXT)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cfg_lookup ON cfg_keys (key, value)")
+        return conn
+
+    # Return modification time of file or dir, None if missing
+    def mtime(self, path: str) -> int:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    # Get result state from parent directory: pending/captured/failed
+    def result_state(self, result_path: str) -> str:
+        parent = os.path.dirname(os.path.normpath(result_path))
+        for state in ["pending", "captured", "failed"]:
+            if parent == os.path.normpath(self.glob.stg[state + '_path']):
+                return state
+        return None
+
+    # Read result report and write index row
+    def write_result(self, conn, result_path: str) -> None:
+        report_mtime = self.mtime(os.path.join(result_path, self.glob.stg['bench_report_file']))
+        report = self.glob.lib.report.read(result_path)
+        conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                     (result_path, self.result_state(result_path), report_mtime, json.dumps(report or None)))
+
+    # Add result to index, called after writing bench report
+    def add_result(self, result_path: str) -> None:
+        if not self.active():
+            return
+        try:
+            with closing(self.connect()) as conn, conn:
+                self.write_result(conn, result_path)
+        except sqlite3.Error as err:
+            self.disable(err)
+
+    # Remove result from index
+    def drop_result(self, result_path: str) -> None:
+        if not self.active():
+            return
+        try:
+            with closing(self.connect()) as conn, conn:
+                conn.execute("DELETE FROM results WHERE path = ?", (result_path,))
+        except sqlite3.Error as err:
+            self.disable(err)
+
+    # Update index after moving result dir to archive
+    def move_result(self, old_path: str, new_path: str) -> None:
+        if not self.active():
+            return
+        try:
+            with closing(self.connect()) as conn, conn:
+                cur = conn.execute("UPDATE results SET path = ?, state = ? WHERE path = ?",
+                                   (new_path, self.result_state(new_path), old_path))
+                # Not indexed yet
+                if not cur.rowcount:
+                    self.write_result(conn, new_path)
+        except sqlite3.Error as err:
+            self.disable(err)
+
+    # Reconcile index with result directory if it changed since last sync
+    def sync(self, conn, top_path: str) -> None:
+
+        top_mtime = self.mtime(top_path)
+        row = conn.execute("SELECT mtime FROM dirs WHERE path = ?", (top_path,)).fetchone()
+
+        # Directory unchanged, index is current
+        if row and row[0] == top_mtime:
+            return
+
+        self.glob.lib.msg.log("Updating results index for " + self.glob.lib.rel_path(top_path))
+
+        on_disk = set(self.glob.lib.files.get_subdirs_path(top_path))
+        prefix = os.path.join(top_path, "")
+        indexed = dict(conn.execute("SELECT path, mtime FROM results WHERE substr(path, 1, ?) = ?",
+                                    (len(prefix), prefix)).fetchall())
+
+        # Drop removed results
+        for path in indexed:
+            if path not in on_disk:
+                conn.execute("DELETE FROM results WHERE path = ?", (path,))
+
+        # Add new and modified results
+        for path in on_disk:
+            if path not in indexed or indexed[path] != self.mtime(os.path.join(path, self.glob.stg['bench_report_file'])):
+                self.write_result(conn, path)
+
+        conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?)", (top_path, top_mtime))
+
+    # Return list of [path, report] for results in directory
+    def results(self, top_path: str) -> List[list]:
+
+        if self.active():
+            try:
+                with closing(self.connect()) as conn, conn:
+                    self.sync(conn, top_path)
+                    prefix = os.path.join(top_path, "")
+                    rows = conn.execute("SELECT path, report FROM results WHERE substr(path, 1, ?) = ? ORDER BY path",
+                                        (len(prefix), prefix)).fetchall()
+                    return [[path, json.loads(report)] for path, report in rows]
+
+            except sqlite3.Error as err:
+                self.disable(err)
+
+        # Index disabled, reports read later
+        return [[path, None] for path in sorted(self.glob.lib.files.get_subdirs_path(top_path))]
+
+    # Return subdirs of application tree dir, from index if dir unchanged
+    def subdirs(self, conn, path: str) -> List[str]:
+        path_mtime = self.mtime(path)
+        row = conn.execute("SELECT mtime, children FROM app_dirs WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == path_mtime:
+            return json.loads(row[1])
+
+        children = sorted(self.glob.lib.files.get_subdirs(path))
+        conn.execute("INSERT OR REPLACE INTO app_dirs VALUES (?, ?, ?)", (path, path_mtime, json.dumps(children)))
+        return children
+
+    # Walk application tree to max depth, same as files.search_tree
+    def walk(self, conn, app_list: List[str], path: str, depth: int) -> None:
+        for sub in self.subdirs(conn, path):
+            if sub != self.glob.stg['module_dir']:
+                new_dir = os.path.join(path, sub)
+                # Once tree hits max search depth, append path to list
+                if not depth:
+                    app_list.append(new_dir)
+                # Else continue to search tree
+                else:
+                    self.walk(conn, app_list, new_dir, depth - 1)
+
+    # Read build report and write index row
+    def write_app(self, conn, app_path: str) -> list:
+        report_mtime = self.mtime(os.path.join(app_path, self.glob.stg['build_report_file']))
+        report = self.glob.lib.report.read(app_path)
+        conn.execute("INSERT OR REPLACE INTO apps VALUES (?, ?, ?, ?)",
+                     (app_path, report_mtime, json.dumps(report or None), None))
+        return [report, None]
+
+    # Return [report, status] of application, from index if build report unchanged
+    def app_report(self, conn, app_path: str) -> list:
+        report_mtime = self.mtime(os.path.join(app_path, self.glob.stg['build_report_file']))
+        row = conn.execute("SELECT mtime, report, status FROM apps WHERE path = ?", (app_path,)).fetchone()
+        if row and report_mtime and row[0] == report_mtime:
+            return [json.loads(row[1]), row[2]]
+        return self.write_app(conn, app_path)
+
+    # Add application to index, called after writing build report
+    def add_app(self, app_path: str) -> None:
+        if not self.active():
+            return
+        try:
+            with closing(self.connect()) as conn, conn:
+                self.write_app(conn, app_path)
+        except sqlite3.Error as err:
+            self.disable(err)
+
+    # Remove application from index
+    def drop_app(self, app_path: str) -> None:
+        if not self.active():
+            return
+        try:
+            with closing(self.connect()) as conn, conn:
+                conn.execute("DELETE FROM apps WHERE path = ?", (app_path,))
+        except sqlite3.Error as err:
+            self.disable(err)
+
+    # Store final status of applications: {path: status}
+    def set_app_status(self, status_dict: dict) -> None:
+        if not self.active() or not status_dict:
+            return
+        try:
+            with closing(self.connect()) as conn, conn:
+                conn.executemany("UPDATE apps SET status = ? WHERE path = ?",
+                                 [(status, path) for path, status in status_dict.items()])
+        except sqlite3.Error as err:
+            self.disable(err)
+
+    # Return list of [path, report, status] for applications in app dir, status is None unless final
+    def apps(self, top_path: str, depth: int) -> List[list]:
+
+        if self.active():
+            try:
+                with closing(self.connect()) as conn, conn:
+                    app_paths = []
+                    self.walk(conn, app_paths, top_path, depth)
+                    return [[path] + self.app_report(conn, path) for path in app_paths]
+
+            except sqlite3.Error as err:
+                self.disable(err)
+
+        # Index disabled, walk directory tree
+        app_paths = []
+        start = top_path.count(self.glob.stg['sl'])
+        self.glob.lib.files.search_tree(app_paths, top_path, start, start, start + depth)
+        return [[path, self.glob.lib.report.read(path), None] for path in app_paths]
+
+    # Parse cfg files which are new or modified since last indexed
+    def sync_cfgs(self, conn, cfg_files: List[str]) -> None:
+        for cfg_file in cfg_files:
+            try:
+                stat = os.stat(cfg_file)
+            except OSError:
+                continue
+
+            row = conn.execute("SELECT mtime, size FROM cfgs WHERE path = ?", (cfg_file,)).fetchone()
+            if row and row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+                continue
+
+            self.glob.lib.msg.log("Indexing " + self.glob.lib.rel_path(cfg_file))
+            cfg = self.glob.lib.files.read_cfg(cfg_file)
+            conn.execute("INSERT OR REPLACE INTO cfgs VALUES (?, ?, ?, ?)",
+                         (cfg_file, stat.st_mtime_ns, stat.st_size, json.dumps(cfg)))
+
+            # Update lookup keys
+            conn.execute("DELETE FROM cfg_keys WHERE path = ?", (cfg_file,))
+            conn.executemany("INSERT INTO cfg_keys VALUES (?, ?, ?)",
+                             [(cfg_file, key, str(cfg[sec][key])) for sec in cfg for key in self.cfg_lookup_keys if key in cfg[sec]])
+
+    # Return parsed cfgs from list of files, skipping cfgs with a value set which differs from search_dict
+    def cfgs(self, cfg_files: List[str], search_dict: dict) -> List[dict]:
+
+        if self.active():
+            try:
+                with closing(self.connect()) as conn, conn:
+                    self.sync_cfgs(conn, cfg_files)
+
+                    # Get cfgs which can't match search
+                    excluded = set()
+                    for key in self.cfg_lookup_keys:
+                        if search_dict.get(key):
+                            excluded.update(path for path, in conn.execute(
+                                "SELECT path FROM cfg_keys WHERE key = ? AND value != '' AND value != ?",
+                                (key, str(search_dict[key]))))
+
+                    cfg_list = []
+                    for cfg_file in cfg_files:
+                        if cfg_file not in excluded:
+                            row = conn.execute("SELECT cfg FROM cfgs WHERE path = ?", (cfg_file,)).fetchone()
+                            if row:
+                                cfg_list.append(json.loads(row[0]))
+                    return cfg_list
+
+            except sqlite3.Error as err:
+                self.disable(err)
+
+        # Index disabled, parse every cfg file
+        return [self.glob.lib.files.read_cfg(cfg_file) for cfg_file in cfg_files]
@@ -63,6 +63,7 @@ class init(object):
 
         # Delete application dir
         self.glob.lib.files.prune_tree(path)
+        self.glob.lib.index.drop_app(path)
         print("Application removed.")
         # Detele module dir
         self.glob.lib.files.delete_file(mod_file)
@@ -1,12 +1,17 @@
 # System Imports
+import hashlib
+import json
 import os
 import shutil as su
 import subprocess
 import sys
+import time
 
 class init(object):
     def __init__(self, glob):
         self.glob = glob
+        # Module lists read this session: {MODULEPATH fingerprint: {'time', 'defaults', 'available'}}
+        self.module_maps = {}
         self.sanitize_modulepath()
 
     # Execute an LMOD command
@@ -56,11 +61,88 @@ class init(object):
             if not os.path.isdir(module_path):
                 self.glob.lib.msg.warn("ml use path not found: " + module_path)
 
-            # Append to $MODULEPATH
-            os.environ["MODULEPATH"] = module_path + ":" + os.environ["MODULEPATH"]
+            # Append to $MODULEPATH, once per session
+            if module_path not in os.environ["MODULEPATH"].split(":"):
+                os.environ["MODULEPATH"] = module_path + ":" + os.environ["MODULEPATH"]
 
         # Set default system modules
-        self.glob.default_module_list = self.lmod_query(['-t', '-d', 'av']).split("\n")
+        self.glob.default_module_list = self.get_module_map()['defaults']
+
+    # Get key for module cache, available modules depend on MODULEPATH
+    def modulepath_fingerprint(self) -> str:
+        return hashlib.sha1(os.environ.get("MODULEPATH", "").encode()).hexdigest()
+
+    # Get module names from terse Lmod output, skipping MODULEPATH headers and markers
+    def parse_terse(self, output: str) -> list:
+        modules = []
+        for line in output.split("\n"):
+            line = line.strip()
+            if not line or line.endswith(":") or line.endswith("/"):
+                continue
+            modules.append(line.replace("(default)", ""))
+        return modules
+
+    # Query Lmod for default and available modules on MODULEPATH
+    def query_modules(self) -> dict:
+        self.glob.lib.msg.log("Querying Lmod for available modules")
+        return {'time':         time.time(),
+                'defaults':     self.parse_terse(self.lmod_query(['-t', '-d', 'av'])),
+                'available':    self.parse_terse(self.lmod_query(['-t', 'av']))}
+
+    # Read module cache file: {fingerprint: {'time', 'defaults', 'available'}}
+    def read_module_cache(self) -> dict:
+        try:
+            with open(self.glob.stg['module_cache_path']) as fp:
+                cache = json.load(fp)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    # Write module cache file via tmp file, expired entries are dropped
+    def write_module_cache(self, cache: dict) -> None:
+        cache = {key: entry for key, entry in cache.items() if time.time() - entry.get('time', 0) < self.glob.stg['module_cache_ttl']}
+        tmp_file = self.glob.stg['module_cache_path'] + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(tmp_file, "w") as fp:
+                json.dump(cache, fp)
+            os.replace(tmp_file, self.glob.stg['module_cache_path'])
+        except OSError as err:
+            self.glob.lib.msg.log("Unable to write module cache: " + str(err))
+
+    # Get default and available modules for MODULEPATH, from cache file if younger than 'module_cache_ttl'
+    def get_module_map(self) -> dict:
+
+        fingerprint = self.modulepath_fingerprint()
+        if fingerprint in self.module_maps:
+            return self.module_maps[fingerprint]
+
+        module_map = None
+        if self.glob.stg['module_cache']:
+            module_map = self.read_module_cache().get(fingerprint)
+            if module_map and time.time() - module_map.get('time', 0) >= self.glob.stg['module_cache_ttl']:
+                module_map = None
+
+        # Expired or missing
+        if not module_map:
+            module_map = self.query_modules()
+            if self.glob.stg['module_cache']:
+                cache = self.read_module_cache()
+                cache[fingerprint] = module_map
+                self.write_module_cache(cache)
+
+        # Lookup set of full names and name prefixes: intel/19.1.1 => intel/19.1.1, intel
+        names = set()
+        for module in module_map['available']:
+            parts = module.split("/")
+            names.update("/".join(parts[:idx]) for idx in range(1, len(parts) + 1))
+
+        # Default module of each name: intel => intel/19.1.1
+        default_names = {}
+        for module in module_map['defaults']:
+            default_names.setdefault(module.rsplit("/", 1)[0], module)
+
+        self.module_maps[fingerprint] = {**module_map, 'names': names, 'default_names': default_names}
+        return self.module_maps[fingerprint]
 
     # Gets full module name of default module, eg: 'intel' -> 'intel/18.0.2'
     def get_full_mod_name(self, module):
@@ -68,6 +150,9 @@ class init(object):
         # No slashes and no digits = short form module
         if (not '/' in module) or all(not char.isdigit() for char in module):
             # Get default module version from lmod
+            default = self.get_module_map()['default_names'].get(module)
+            if default:
+                return default
             for default in self.glob.default_module_list:
                 if default.startswith(module):
                     return default
@@ -84,8 +169,8 @@ class init(object):
 
             # If module is non Null
             if value:
-                # Module exists
-                if self.lmod_query(['show', value]):
+                # Module exists, ask Lmod for modules not in available list (hidden or hierarchical)
+                if value in self.get_module_map()['names'] or self.lmod_query(['show', value]):
                     # Return full module name
                     return self.get_full_mod_name(value) 
         else: 
@@ -142,7 +227,7 @@ class init(object):
 
         return mod_obj
 
-    # Replace <<<>>> vars in copied template
+    # Replace <<<>>> vars in copied template, returns [mod_obj, unfilled <<<keys>>>]
     def populate_mod_template(self, mod_obj):
         # Get comma delimited list of non-Null build modules
         mod_list = []
@@ -157,11 +242,7 @@ class init(object):
 
         pop_dict = {**mod, **self.glob.config['metadata'], **self.glob.config['general'], **self.glob.config['config'], **self.glob.ev}
 
-        for key in pop_dict:
-            self.glob.lib.msg.log("replace " + "<<<" + key + ">>> with " + str(pop_dict[key]))
-            mod_obj = [line.replace("<<<" + str(key) + ">>>", str(pop_dict[key])) for line in mod_obj]
-        
-        return mod_obj
+        return self.glob.lib.template.render([pop_dict], mod_obj)
 
     # Write module to file
     def write_mod_file(self, module, tmp_mod_file):
@@ -210,7 +291,7 @@ class init(object):
         mod_obj = self.copy_mod_template(module_template)
 
         # Populuate template with config params
-        mod_obj = self.populate_mod_template(mod_obj)
+        mod_obj, missing = self.populate_mod_template(mod_obj)
 
         # Add depends_on lines
         for mod in self.glob.config['modules']:
@@ -218,7 +299,7 @@ class init(object):
 
         # Test module template
         tmp_mod_file = os.path.join(self.glob.ev['BP_HOME'], "tmp." + mod_file)
-        self.glob.lib.template.test_template(tmp_mod_file, mod_obj)
+        self.glob.lib.template.test_template(tmp_mod_file, mod_obj, missing)
         # Write module template to file
         self.glob.lib.files.write_list_to_file(mod_obj, tmp_mod_file)
 
@@ -6,6 +6,7 @@ import random
 import signal
 import subprocess
 import sys
+import threading
 import time
 from tabulate import tabulate
 import textwrap
@@ -13,6 +14,8 @@ from typing import List
 
 from src.modules import Result
 
+# Per-thread message buffer, used by result processing workers
+thread_buffer = threading.local()
 
 class init(object):
 
@@ -48,8 +51,38 @@ class init(object):
         return message
 
 
+    # Hold messages from this thread until flushed
+    def start_buffer(self) -> None:
+        thread_buffer.entries = []
+
+
+    # Stop holding messages, return held messages
+    def end_buffer(self) -> list:
+        entries = getattr(thread_buffer, "entries", None) or []
+        thread_buffer.entries = None
+        return entries
+
+
+    # Write held messages to log and stdout
+    def flush_buffer(self, entries: list) -> None:
+        for entry in entries:
+            # Log only
+            if entry[1] is None:
+                self.log(entry[0])
+            else:
+                self.log_and_print(entry[0], entry[1])
+
+
+    # Check if messages from this thread are being held
+    def buffering(self) -> bool:
+        return getattr(thread_buffer, "entries", None) is not None
+
+
     # Write message to log 
     def log(self, message: str):
+        if self.buffering():
+            thread_buffer.entries.append([message, None])
+            return
         # If initialized
         if self.glob.log:
             self.glob.log.debug(message)
@@ -57,6 +90,10 @@ class init(object):
 
     # Log and print to stdout
     def log_and_print(self, message, priority):
+        if self.buffering():
+            thread_buffer.entries.append([message, priority])
+            return
+
         message = self.listify(message)
 
         # Print to stdout if msg priority meets verbosity level
@@ -180,15 +217,11 @@ class init(object):
         if not os.path.isfile(file_path):
             self.glob.lib.msg.error("File not found: " + self.glob.lib.rel_path(file_path))
 
-        print()
-        print("=====> " + self.glob.lib.rel_path(file_path) + " <=====")
-
-        # Print last 20 lines
-        with open(file_path, 'r') as fp:
-                lines = fp.readlines()
-                [print(x.strip()) for x in lines[max(-15, (len(lines)*-1)):]]
-
-        print("=====> " + self.glob.lib.rel_path(file_path) + " <=====")
+        # Last 15 lines, sent as one message so result workers don't interleave tails
+        lines = ["=====> " + self.glob.lib.rel_path(file_path) + " <====="] + \
+                [x.strip() for x in self.glob.lib.files.tail(file_path, 15)] + \
+                ["=====> " + self.glob.lib.rel_path(file_path) + " <====="]
+        self.log_and_print(lines, 1)
 
 
     # Print the list of installed applications
@@ -288,9 +321,11 @@ class init(object):
 
         self.glob.lib.msg.high("Collecting " + str(len(table_contents)) + " results...")
 
+        # Process results
+        self.glob.lib.result.process_list(table_contents)
+
         # Populate each row
         for record in table_contents:
-            record.process()
             row = self.get_table_row(record)
             table.append(row)
 
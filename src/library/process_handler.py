@@ -1,62 +1,348 @@
 # System Imports
+import fcntl
+import glob as gb
+import json
 import os
+import shutil as su
 import sys
 import subprocess
+import time
 
 class init(object):
     def __init__(self, glob):
             self.glob = glob
 
-    # Run script in shell
-    def start_local_shell(self):
+    # Check if task ID belongs to local executor, older reports store PID
+    def is_task(self, task_id) -> bool:
+        return str(task_id).startswith("local_")
+
+    # Path to task record in local queue dir, finished tasks are moved to done/ so the runner doesn't rescan them
+    def task_path(self, task_id: str, done: bool = False) -> str:
+        if done:
+            return os.path.join(self.glob.stg['local_queue_path'], "done", str(task_id) + ".json")
+        return os.path.join(self.glob.stg['local_queue_path'], str(task_id) + ".json")
+
+    # Read task record, None if missing
+    def read_task(self, task_id: str) -> dict:
+        for path in [self.task_path(task_id), self.task_path(task_id, True)]:
+            try:
+                with open(path) as fp:
+                    return json.load(fp)
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError):
+                return None
+        return None
+
+    # Write task record via tmp file, copy to result dir once started
+    def write_task(self, task: dict) -> None:
+        finished = task['state'] in ["COMPLETED", "FAILED"]
+        paths = [self.task_path(task['task_id'], finished)]
+        if task['state'] != "PENDING":
+            paths.append(os.path.join(task['working_path'], self.glob.stg['local_task_file']))
+        if finished:
+            os.makedirs(os.path.dirname(paths[0]), exist_ok=True)
+
+        for path in paths:
+            tmp_file = path + "." + str(os.getpid()) + ".tmp"
+            try:
+                with open(tmp_file, "w") as fp:
+                    json.dump(task, fp, indent=1)
+                os.replace(tmp_file, path)
+            # Result dir removed
+            except FileNotFoundError:
+                continue
+
+        # Remove from queue dir once record is in done/
+        if finished:
+            try:
+                os.remove(self.task_path(task['task_id']))
+            except FileNotFoundError:
+                pass
+
+    # Get ID of current boot, PIDs are only unique within one boot
+    def boot_id(self) -> str:
+        try:
+            with open("/proc/sys/kernel/random/boot_id") as fp:
+                return fp.read().strip()
+        except OSError:
+            return None
+
+    # Get start time of process in clock ticks since boot, None if not running
+    def proc_start(self, pid) -> int:
+        try:
+            with open(os.path.join("/proc", str(pid), "stat")) as fp:
+                stat = fp.read()
+        except OSError:
+            return None
+        # Fields after command name, which may contain spaces, starttime is field 22
+        try:
+            return int(stat.rsplit(")", 1)[1].split()[19])
+        except (IndexError, ValueError):
+            return None
+
+    # Get command line of process, None if not running
+    def proc_cmdline(self, pid) -> str:
+        try:
+            with open(os.path.join("/proc", str(pid), "cmdline"), "rb") as fp:
+                return fp.read().replace(b"\0", b" ").decode(errors="replace").strip()
+        except OSError:
+            return None
+
+    # Check if task process is still the one the runner started, not a reused PID
+    def task_alive(self, task: dict) -> bool:
+        return task['pid'] is not None and task.get('boot_id') == self.boot_id() and \
+               task.get('proc_start') is not None and self.proc_start(task['pid']) == task['proc_start']
+
+    # Check if a runner holds the queue lock
+    def runner_active(self) -> bool:
+        lock_file = os.path.join(self.glob.stg['local_queue_path'], "runner.lock")
+        try:
+            with open(lock_file, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    # Read exit code written by task wrapper after script finished, None if missing
+    def read_exit_code(self, working_path: str) -> int:
+        try:
+            with open(os.path.join(working_path, self.glob.stg['local_exit_file'])) as fp:
+                return int(fp.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    # Set final state of task whose process ended without runner recording exit code
+    def resolve_lost(self, task: dict) -> None:
+        task['exit_code'] = self.read_exit_code(task['working_path'])
+        if task['exit_code'] is not None:
+            task['state'] = "COMPLETED" if task['exit_code'] == 0 else "FAILED"
+        # Killed before writing exit code, bench script may still have reached its epilog
+        else:
+            marker = self.glob.lib.files.read_marker(task['working_path'])
+            task['state'] = marker['status'] if marker else "FAILED"
+        task['end'] = time.time()
+        self.write_task(task)
+
+    # Get number of cores used by task
+    def get_task_cores(self) -> int:
+        try:
+            if self.glob.stg['op_mode'] == "bench":
+                return int(self.glob.config['runtime']['ranks_per_node']) * int(self.glob.config['runtime']['threads'])
+            return int(self.glob.sched['sched']['threads'])
+        except (KeyError, TypeError, ValueError):
+            return 1
+
+    # Get number of cores local tasks can use at once, from system.cfg limited to this host
+    def get_core_budget(self) -> int:
+        avail = len(os.sched_getaffinity(0))
+        try:
+            return min(int(self.glob.system['cores']), avail)
+        except (KeyError, TypeError, ValueError):
+            return avail
+
+    # Add script to local executor queue and make sure runner is active, returns task ID
+    def start_local_shell(self) -> str:
 
         # Path to bash script
         script_path = os.path.join(self.glob.config['metadata']['working_path'], self.glob.job_file)
         self.glob.lib.msg.low("Starting script: " + self.glob.lib.rel_path(script_path))
 
-        # Get full paths for redirection
-        stdout_path = os.path.join(self.glob.config['metadata']['working_path'], self.glob.config['config']['stdout'])
-        stderr_path = os.path.join(self.glob.config['metadata']['working_path'], self.glob.config['config']['stderr'])
-        try:
-            # Redirect stdout and stderr to files
-            with open(stdout_path, 'wb') as out_file, open(stderr_path, 'wb') as err_file:
+        os.makedirs(self.glob.stg['local_queue_path'], exist_ok=True)
+
+        budget = self.get_core_budget()
+        task = {'task_id':      "local_" + self.glob.lib.get_unique_id(12),
+                'script':       script_path,
+                'working_path': self.glob.config['metadata']['working_path'],
+                # Get full paths for redirection
+                'stdout':       os.path.join(self.glob.config['metadata']['working_path'], self.glob.config['config']['stdout']),
+                'stderr':       os.path.join(self.glob.config['metadata']['working_path'], self.glob.config['config']['stderr']),
+                'cores':        min(self.get_task_cores(), budget),
+                'budget':       budget,
+                'concurrency':  int(self.glob.stg['local_concurrency']),
+                'pin':          self.glob.stg['local_pin_cores'],
+                # Wait for running local build
+                'deps':         [self.glob.prev_pid] if self.is_task(self.glob.prev_pid) else [],
+                'state':        "PENDING",
+                'submit':       time.time(),
+                'start':        None,
+                'end':          None,
+                'pid':          None,
+                'core_list':    [],
+                'exit_code':    None}
+
+        self.write_task(task)
+        self.start_runner()
 
-                # Start bash script
-                cmd = subprocess.Popen(['bash', script_path], stdout=out_file, stderr=err_file)
-                # Store PID
-                self.glob.prev_pid = cmd.pid
+        self.glob.lib.msg.low("Script queued on local machine as " + task['task_id'])
+        return task['task_id']
 
-        except subprocess.CalledProcessError as e:
+    # Start detached runner process unless one is active
+    def start_runner(self) -> None:
+
+        lock_file = os.path.join(self.glob.stg['local_queue_path'], "runner.lock")
+        with open(lock_file, "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Runner active, it picks up new tasks
+            except BlockingIOError:
+                return
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+        log_file = os.path.join(self.glob.stg['local_queue_path'], "runner.log")
+        try:
+            with open(log_file, "a") as log:
+                subprocess.Popen([sys.executable, os.path.abspath(sys.argv[0]), "--localRunner"],
+                                 stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        except OSError as e:
             print(e)
-            self.glob.lib.msg.error("failed to start script in local shell.")
+            self.glob.lib.msg.error("failed to start local task runner.")
+
+    # Start queued task, pinned to free cores if enabled
+    def run_task(self, task: dict, free_cores: list) -> subprocess.Popen:
+
+        # Wrapper writes exit code to working dir, task status survives the runner
+        exit_file = os.path.join(task['working_path'], self.glob.stg['local_exit_file'])
+        cmd = ['bash', '-c', 'bash "$1"; code=$?; echo $code > "$2.tmp" && mv "$2.tmp" "$2"; exit $code', 'bp_task', task['script'], exit_file]
+        if task['pin'] and su.which("taskset"):
+            task['core_list'] = free_cores[:task['cores']]
+            cmd = ['taskset', '-c', ",".join(str(core) for core in task['core_list'])] + cmd
+
+        # Redirect stdout and stderr to files
+        with open(task['stdout'], 'wb') as out_file, open(task['stderr'], 'wb') as err_file:
+            proc = subprocess.Popen(cmd, cwd=task['working_path'], stdout=out_file, stderr=err_file, stdin=subprocess.DEVNULL)
+
+        task['state'] = "RUNNING"
+        task['pid'] = proc.pid
+        task['boot_id'] = self.boot_id()
+        task['proc_start'] = self.proc_start(proc.pid)
+        task['start'] = time.time()
+        self.write_task(task)
+        print("Started " + task['task_id'] + " PID " + str(proc.pid) + " on " + str(task['cores']) + " cores", flush=True)
+        return proc
+
+    # Get state of task dependency, legacy PIDs are finished once gone from /proc
+    def dep_state(self, dep) -> str:
+        if self.is_task(dep):
+            return self.task_status(dep).replace("UNKNOWN", "COMPLETED")
+        return "COMPLETED" if self.complete(dep) else "RUNNING"
+
+    # Get tasks in state, in submission order
+    def tasks(self, state: str) -> list:
+        tasks = [self.read_task(os.path.basename(path)[:-len(".json")])
+                 for path in gb.glob(os.path.join(self.glob.stg['local_queue_path'], "local_*.json"))]
+        return sorted([task for task in tasks if task and task['state'] == state], key=lambda task: task['submit'])
+
+    # Run queued tasks until queue is empty, for 'benchpro --localRunner'
+    def run_queue(self) -> None:
+
+        lock_file = os.path.join(self.glob.stg['local_queue_path'], "runner.lock")
+        lock = open(lock_file, "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+
+        # Move finished records left in queue dir by older runners to done/
+        for task in self.tasks("COMPLETED") + self.tasks("FAILED"):
+            self.write_task(task)
+
+        # task_id: [process, task]
+        running = {}
+        all_cores = sorted(os.sched_getaffinity(0))
 
-        self.glob.lib.msg.low("Script started on local machine.")
+        while True:
+            # Record finished tasks
+            for task_id, (proc, task) in list(running.items()):
+                if proc.poll() is None:
+                    continue
+                task['exit_code'] = proc.returncode
+                task['end'] = time.time()
+                task['state'] = "COMPLETED" if proc.returncode == 0 else "FAILED"
+                self.write_task(task)
+                print("Finished " + task_id + " exit code " + str(proc.returncode), flush=True)
+                del running[task_id]
+
+            # Tasks started by a previous runner which have ended
+            for task in self.tasks("RUNNING"):
+                if task['task_id'] not in running and not self.task_alive(task):
+                    self.resolve_lost(task)
+
+            pending = self.tasks("PENDING")
+            for task in pending:
+                dep_states = [self.dep_state(dep) for dep in task['deps']]
+                # Dependency failed, never run
+                if "FAILED" in dep_states:
+                    task['state'] = "FAILED"
+                    task['end'] = time.time()
+                    self.write_task(task)
+                    continue
+                if any(state not in ["COMPLETED"] for state in dep_states):
+                    continue
+
+                # Check concurrency and core budget
+                used = sum(run['cores'] for proc, run in running.values())
+                if len(running) >= max(task['concurrency'], 1) or used + task['cores'] > task['budget']:
+                    # Start in order, unless nothing is running
+                    if running:
+                        break
+                    continue
+
+                busy = set(core for proc, run in running.values() for core in run['core_list'])
+                running[task['task_id']] = [self.run_task(task, [core for core in all_cores if core not in busy]), task]
+
+            if not running and not pending:
+                # Release lock, then check for tasks added while exiting
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                if not self.tasks("PENDING"):
+                    break
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # Another runner took over
+                except BlockingIOError:
+                    break
+
+            time.sleep(1)
+
+        lock.close()
 
     # Check if pid is running or not
-    def complete(self, pid: int) -> bool:
-        # Check for pid in /proc
-        if os.path.isdir(os.path.join("/proc", str(pid))):
-            return False
-        return True
+    def complete(self, pid) -> bool:
+        return self.task_status(pid) in ["COMPLETED", "FAILED", "UNKNOWN"]
 
 
     def task_status(self, pid: str) -> str:
-        if self.complete(pid):
+        # Local executor task
+        if self.is_task(pid):
+            task = self.read_task(pid)
+            if not task:
+                return "UNKNOWN"
+
+            # Process ended but no runner is left to record it
+            if task['state'] == "RUNNING" and not self.task_alive(task) and not self.runner_active():
+                self.resolve_lost(task)
+            return task['state']
+
+        # Legacy PID, no process start time was recorded to tell it apart from a reused PID
+        cmdline = self.proc_cmdline(pid)
+        if not cmdline or not cmdline.startswith("bash"):
             return "COMPLETED"
-        return "RUNNING"
+        return "UNKNOWN"
 
 
     # Display local shells to assist with determining if local job is still busy
     def print_local_pid(self, pid):
 
-        try:
-            cmd = subprocess.run("ps -aux | grep " + pid, shell=True,
-                                    check=True, capture_output=True, universal_newlines=True)
-
-        except subprocess.CalledProcessError as e:
-            self.glob.lib.msg.error("Failed to run 'ps -aux'")
-
-        for line in cmd.stdout.split("\n"):
-            if "bash" in line:
-                print(" " + line)
+        # Local executor task
+        if self.is_task(pid):
+            task = self.read_task(pid)
+            if task:
+                print(" " + task['task_id'] + " " + self.task_status(pid) + " PID " + str(task['pid']) + " " + task['script'])
+            return
 
+        cmdline = self.proc_cmdline(pid)
+        if cmdline:
+            print(" " + str(pid) + " " + cmdline)
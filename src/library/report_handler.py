@@ -10,6 +10,8 @@ import time
 class init(object):
     def __init__(self, glob):
             self.glob = glob
+            # Parsed reports: report_file -> [mtime, size, report_dict]
+            self.store = {}
 
 
     # Read report file into dict, accepts file path or directory path containing default report file name
@@ -40,18 +42,35 @@ class init(object):
         return report_file
 
     
+    # Return parsed report file, parse only if new or modified since last read
+    def load(self, report_file: str) -> dict:
+        try:
+            stat = os.stat(report_file)
+        except OSError:
+            return self.ingest(report_file)
+
+        stored = self.store.get(report_file)
+        if stored and stored[0] == stat.st_mtime_ns and stored[1] == stat.st_size:
+            return stored[2]
+
+        report = self.ingest(report_file)
+        self.store[report_file] = [stat.st_mtime_ns, stat.st_size, report]
+        return report
+
+
     def read(self, report_path: str):
 
         report_file = self.report_file(report_path)
         if not report_file:
             return False
 
-        # Read report file from disk
-        report = self.ingest(report_file)
+        # Read report file from disk, or from store if unchanged
+        report = self.load(report_file)
 
         # Compatible report
         if self.glob.lib.version.compat_report(report):
-            return report
+            # Copy sections so callers can't modify stored report
+            return {section: dict(report[section]) for section in report}
         # Incompatible
         else:
             self.glob.lib.msg.high("Report file is no longer compatible.")
@@ -95,11 +114,13 @@ class init(object):
                     "task_id        = "+ str(self.glob.task_id),
                     "stdout         = "+ self.glob.config['config']['stdout'],
                     "stderr         = "+ self.glob.config['config']['stderr']
-
                   ])
+        content.extend(self.rules_section())
 
         # Write content to file
         self.write(content, os.path.join(self.glob.config['metadata']['working_path'], self.glob.stg['build_report_file']))
+        # Add new application to index
+        self.glob.lib.index.add_app(self.glob.config['metadata']['working_path'])
 
     def bench(self):
 
@@ -139,9 +160,46 @@ class init(object):
         content.append("[result]")
         for key in self.glob.config['result']:
             content.append(key.ljust(15) + "= " + self.glob.config['result'][key])
+        content.extend(self.rules_section())
 
         # Write content to file
         self.write(content, os.path.join(self.glob.config['metadata']['working_path'],self.glob.stg['bench_report_file']))
+        # Add new result to index
+        self.glob.lib.index.add_result(self.glob.config['metadata']['working_path'])
+
+    # System rules fired for this task, kept out of [build] and [bench] which are captured to database tables
+    def rules_section(self) -> list:
+        fired = self.glob.config['metadata'].get('rules_fired', [])
+        if not fired:
+            return []
+        return ["[rules]",
+                "fired          = "+ "; ".join(fired)]
+
+    # Set task_id of queued bench once submitted, and default output file if unset
+    def set_task_id(self, result_path: str, task_id: str) -> None:
+
+        report_file = os.path.join(result_path, self.glob.stg['bench_report_file'])
+        with open(report_file) as fp:
+            lines = fp.readlines()
+
+        section = None
+        for idx, line in enumerate(lines):
+            if line.startswith("["):
+                section = line.strip()
+            key = line.split("=")[0].strip()
+            if section == "[bench]" and key == "task_id":
+                lines[idx] = "task_id        = " + str(task_id) + "\n"
+            # Use stdout for output if not set
+            elif section == "[result]" and key == "output_file" and not line.split("=", 1)[1].strip():
+                lines[idx] = line.split("=")[0] + "= " + str(task_id) + ".out\n"
+
+        # Write to tmp file and rename, readers never see partial report
+        tmp_file = report_file + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_file, "w") as fp:
+            fp.writelines(lines)
+        os.replace(tmp_file, report_file)
+
+        self.glob.lib.index.add_result(result_path)
 
     # Return sched/local/dry_run from report file
     def get_exec_mode(self, job_type, report_file):
@@ -157,7 +215,8 @@ class init(object):
 
     # Return the binary executable value from provided build path
     def get_build_exe(self, report_path):
-       return self.read(report_path)['build']['bin_dir'], self.read(report_path)['build']['exe_file']
+       report = self.read(report_path)
+       return report['build']['bin_dir'], report['build']['exe_file']
 
 
     def get_build_user(self, report_path):
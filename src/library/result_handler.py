@@ -1,10 +1,12 @@
 # System Imports
+from concurrent.futures import ThreadPoolExecutor
 import configparser as cp
 import copy
 import csv
 from datetime import datetime
 import glob as gb
 import os
+import re
 import shutil as su
 import subprocess
 import sys
@@ -28,106 +30,118 @@ class init(object):
         self.glob = glob
         Result.glob = self.glob
 
-    # Get contents of output file from result dir
-    def set_vars(self, result_path:str) -> dict:
-
-        self.result_path = result_path
+    # Get report contents and output file path from result dir
+    def get_vars(self, result_path: str) -> list:
 
         # Get dict of report file contents
-        self.report_dict = self.glob.lib.report.read(result_path)
-        if not self.report_dict:
+        report_dict = self.glob.lib.report.read(result_path)
+        if not report_dict:
             self.glob.lib.msg.low("Unable to read benchmark report file in " + self.glob.lib.rel_path(result_path))
-            return False
+            return [None, None]
 
         # Deal with dry_run
-        if "dry" in self.report_dict['bench']['task_id']:
+        if "dry" in report_dict['bench']['task_id']:
             self.glob.lib.msg.log("Skipping dry_run in " + result_path)
-            return False
+            return [None, None]
 
         # Get output file path
-        self.output_path = self.glob.lib.files.find_exact(self.report_dict['result']['output_file'], result_path)
+        output_path = self.glob.lib.files.find_exact(report_dict['result']['output_file'], result_path)
         # Test for benchmark output file
-        if not self.output_path:
-            self.glob.lib.msg.log("Result file " + self.report_dict['result']['output_file'] + " not found in " + \
+        if not output_path:
+            self.glob.lib.msg.log("Result file " + report_dict['result']['output_file'] + " not found in " + \
                                     self.glob.lib.rel_path(result_path) + ". It seems the benchmark failed to run.\nWas dry_run=True?")
-            return False
+            return [report_dict, None]
 
-        return True
+        return [report_dict, output_path]
         
 
-    def with_expr(self):
+    def with_expr(self, report_dict: dict, output_path: str):
 
         # replace <file> filename placeholder with value in .cfg
-        self.report_dict['result']['expr'] = self.report_dict['result']['expr'].replace("[output_file]", self.output_path)
+        expr = report_dict['result']['expr'].replace("[output_file]", output_path)
 
-        # Run extraction expression on output file
-        try:
-            self.glob.lib.msg.log("Running: '" + self.report_dict['result']['expr'] + "'")
-            cmd = subprocess.run(self.report_dict['result']['expr'], shell=True,
-                                         check=True, capture_output=True, universal_newlines=True)
-            result_str = cmd.stdout.strip()
-            self.glob.lib.msg.log("Pulled result from " + self.output_path + ":  " + result_str + \
-                            " " + self.report_dict['result']['unit'])
+        # Evaluate common grep/cut/awk/tail pipelines without a shell
+        pipeline = None
+        if self.glob.stg['native_extract']:
+            pipeline = self.glob.lib.extract.compile(report_dict['result']['expr'])
 
-        except subprocess.CalledProcessError as e:
-            self.glob.lib.msg.warn("Using '" + self.report_dict['result']['expr'] + "' on file " + \
-                                    self.glob.lib.rel_path(self.output_path) + \
+        if pipeline:
+            self.glob.lib.msg.log("Evaluating: '" + expr + "'")
+            result_str = self.glob.lib.extract.run(pipeline, output_path)
+
+        # Run extraction expression on output file
+        else:
+            try:
+                self.glob.lib.msg.log("Running: '" + expr + "'")
+                cmd = subprocess.run(expr, shell=True,
+                                             check=True, capture_output=True, universal_newlines=True)
+                result_str = cmd.stdout.strip()
+
+            except subprocess.CalledProcessError as e:
+                result_str = None
+
+        if result_str is None:
+            self.glob.lib.msg.warn("Using '" + expr + "' on file " + \
+                                    self.glob.lib.rel_path(output_path) + \
                                     " failed to find a valid a result. Skipping." )
             return None
 
+        self.glob.lib.msg.log("Pulled result from " + output_path + ":  " + result_str + \
+                        " " + report_dict['result']['unit'])
+
         return result_str
 
-    def with_script(self):
+    def with_script(self, report_dict: dict, output_path: str):
 
         # Check user's directory first
-        result_script = os.path.join(self.glob.stg['user_results_path'],  self.report_dict['result']['script'])
+        result_script = os.path.join(self.glob.stg['user_results_path'],  report_dict['result']['script'])
         if not os.path.exists(result_script):
 
             # Check site's bin dir
-            result_script = os.path.join(self.glob.stg['site_results_path'],  self.report_dict['result']['script'])
+            result_script = os.path.join(self.glob.stg['site_results_path'],  report_dict['result']['script'])
             if not os.path.exists(result_script):
                 self.glob.lib.msg.warn("Result collection script '" + \
-                                        self.report_dict['result']['script'] + \
+                                        report_dict['result']['script'] + \
                                         "' not found in " + \
                                         self.glob.lib.rel_path(self.glob.stg['user_results_path']))
                 return None
 
         # Run validation script on output file
         try:
-            self.glob.lib.msg.log("Running: '" + result_script + " " + self.output_path + "'")
-            cmd = subprocess.run(result_script + " " + self.output_path, shell=True,
+            self.glob.lib.msg.log("Running: '" + result_script + " " + output_path + "'")
+            cmd = subprocess.run(result_script + " " + output_path, shell=True,
                                 check=True, capture_output=True, universal_newlines=True)
             result_str = cmd.stdout.strip()
-            self.glob.lib.msg.log("Pulled result from " + self.output_path + ":  " + result_str + " " + \
-                            self.report_dict['result']['unit'])
+            self.glob.lib.msg.log("Pulled result from " + output_path + ":  " + result_str + " " + \
+                            report_dict['result']['unit'])
 
         except subprocess.CalledProcessError as e:
             self.glob.lib.msg.log("Running script '" + self.glob.lib.rel_path(result_script) + "' on file " + \
-                                                self.glob.lib.rel_path(self.output_path) + \
+                                                self.glob.lib.rel_path(output_path) + \
                                             " failed to find a valid result." )
             return None
 
         return result_str
 
-    def search(self) -> str:
+    def search(self, report_dict: dict, output_path: str, result_path: str) -> str:
 
-        self.glob.lib.msg.log("Looking for valid result in " + self.output_path)
+        self.glob.lib.msg.log("Looking for valid result in " + output_path)
 
         # Run expr collection
-        if self.report_dict['result']['method'] == 'expr':
-            return self.with_expr()
+        if report_dict['result']['method'] == 'expr':
+            return self.with_expr(report_dict, output_path)
             
     
-        elif self.report_dict['result']['method'] == 'script':
-            return self.with_script()
+        elif report_dict['result']['method'] == 'script':
+            return self.with_script(report_dict, output_path)
 
 
         self.glob.lib.msg.warn("Unrecognized result extraction method '" + \
-                                self.report_dict['result']['method'] + \
-                                "' found in " + self.result_path)
+                                report_dict['result']['method'] + \
+                                "' found in " + result_path)
         return None
 
-    def validate(self, result_str: str) -> float:
+    def validate(self, report_dict: dict, output_path: str, result_str: str) -> float:
 
          # Cast to float
         #try:
@@ -135,55 +149,61 @@ class init(object):
         #except:
 
         if "\n" in result_str:
-            self.glob.lib.msg.log("result extracted from " + self.glob.lib.rel_path(self.output_path) + " is not a float: '" + \
+            self.glob.lib.msg.log("result extracted from " + self.glob.lib.rel_path(output_path) + " is not a float: '" + \
                                     result_str + "'")
 
-            self.glob.lib.msg.print_file_tail(os.path.join(self.report_dict['bench']['path'], self.report_dict['bench']['stderr']))
+            self.glob.lib.msg.print_file_tail(os.path.join(report_dict['bench']['path'], report_dict['bench']['stderr']))
             return None
 
 
         # Check float non-zero
         #if not result:
-        #    self.glob.lib.msg.warn("result extracted from " + self.glob.lib.rel_path(self.output_path) + " is '0.0'.")
+        #    self.glob.lib.msg.warn("result extracted from " + self.glob.lib.rel_path(output_path) + " is '0.0'.")
         #    return None
 
         return result_str
 
 
-    # Retrieve result value from output file
-    def extract(self, result_path: str) -> float:
+    # Retrieve result value from output file, returns [value, output_path]
+    def extract(self, result_path: str) -> list:
 
         # Setup collection variables
-        if not self.set_vars(result_path):
-            return 0.
+        report_dict, output_path = self.get_vars(result_path)
+        if not output_path:
+            return [None, None]
 
         # Extract result from file
-        result = self.search()
+        result = self.search(report_dict, output_path, result_path)
         if not result:
-            return 0.
+            return [None, output_path]
 
         # Validate result 
-        valid_result =self.validate(result)
+        valid_result =self.validate(report_dict, output_path, result)
         if not valid_result:
-            return 0.
+            return [None, output_path]
 
-        self.glob.lib.msg.log("Successfully found result '" + result + " " + self.report_dict['result']['unit'] + " for result " + \
+        self.glob.lib.msg.log("Successfully found result '" + result + " " + report_dict['result']['unit'] + " for result " + \
                         self.glob.lib.rel_path(result_path))
 
         # Return valid result
-        return valid_result
+        return [valid_result, output_path]
 
 
     # Get result from benchmark dir
-    def retrieve(self, result_path: str) -> float:
-        # Get cached result
-        cached_result = self.glob.lib.files.decache_result(result_path)
-        if cached_result:
+    def retrieve(self, record: Result) -> float:
+        # Get cached result, None is a valid cached value
+        hit, cached_result = self.glob.lib.files.decache_result(record.path)
+        if hit:
+            record.cached = True
             return cached_result
 
-        else:
-            # Get result from file
-            return self.extract(result_path)
+        # Output file incomplete until task finishes
+        if not record.complete:
+            return None
+
+        # Get result from file
+        value, record.output_path = self.extract(record.path)
+        return value
 
 
     # Create directory on remote server
@@ -300,16 +320,54 @@ class init(object):
            self.glob.lib.msg.error("unknown 'file_copy_handler' option in settings.cfg. Accepts 'scp' or 'cp'.") 
 
 
-    def construct_list(self, top_path: str) -> List[Result]:
+    # Query scheduler once for the state of all uncached results in list
+    def prefetch_status(self, result_list: List[Result]) -> None:
+
+        task_ids = []
+        for result in result_list:
+            # Skip old reports and non-sched results
+            if not result.success or result.bench['exec_mode'] != "sched":
+                continue
+            # Skip results with cached status or completion marker
+            if self.glob.lib.files.decache_status(result.path) or self.glob.lib.files.read_marker(result.path):
+                continue
+            task_ids.append(result.bench['task_id'])
+
+        if task_ids:
+            self.glob.lib.sched.bulk_task_status(task_ids)
+
+
+    # Check if result report matches all search criteria
+    def match_report(self, report: dict, search_dict: dict) -> bool:
+        if not report:
+            return False
+        for key in search_dict:
+            match = False
+            # Key match in [bench] or [build] section
+            for section in ['bench', 'build']:
+                if section in report and key in report[section]:
+                    # Value match
+                    if search_dict[key] == report[section][key]:
+                        match = True
+            if not match:
+                return False
+        return True
+
+
+    def construct_list(self, top_path: str, search_dict: dict = None) -> List[Result]:
         result_list = []
-        for result_dir in self.glob.lib.files.get_subdirs(top_path):
-            # Read report
-            report = Result(os.path.join(top_path, result_dir))
-            if report.success:
-                result_list.append(report)
-            else:
-                result_list.append(report)
-                #print("Incompatible report format.")
+        # Get reports from results index
+        for result_path, report in self.glob.lib.index.results(top_path):
+            # Filter on report content before constructing result
+            if search_dict:
+                report = report or self.glob.lib.report.read(result_path)
+                if not self.match_report(report, search_dict):
+                    continue
+            # Read report, defer processing
+            result_list.append(Result(result_path, False, report))
+
+        # Get scheduler state of all results at once
+        self.prefetch_status(result_list)
         return result_list
 
 
@@ -325,12 +383,45 @@ class init(object):
         return self.construct_list(self.glob.stg['failed_path'])
 
 
+    # Process result with messages held until flushed in order
+    def process_buffered(self, result: Result) -> list:
+        self.glob.lib.msg.start_buffer()
+        try:
+            result.process()
+        except BaseException as err:
+            return [self.glob.lib.msg.end_buffer(), err]
+        return [self.glob.lib.msg.end_buffer(), None]
+
+
+    # Process list of results, concurrently if 'result_workers' > 1
+    def process_list(self, result_list: List[Result]) -> None:
+
+        workers = min(self.glob.stg['result_workers'], len(result_list))
+        if workers < 2:
+            for result in result_list:
+                result.process()
+            return
+
+        self.glob.lib.msg.log("Processing " + str(len(result_list)) + " results with " + str(workers) + " threads")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self.process_buffered, result) for result in result_list]
+            # Print messages in result order
+            for future in futures:
+                messages, err = future.result()
+                self.glob.lib.msg.flush_buffer(messages)
+                if err:
+                    for pending in futures:
+                        pending.cancel()
+                    raise err
+
+
     def get_completed(self) -> List[Result]:
         pending_results = self.get_pending()
         complete_results = []
 
+        self.process_list(pending_results)
         for result in pending_results:
-            result.process()
             if result.success and result.complete and not result.dry_run:
                 complete_results.append(result)
         
@@ -366,31 +457,10 @@ class init(object):
         search_str = search_str or self.glob.args.queryResult
         search_dict = self.glob.lib.parse_input_str(search_str, "result_id")
 
-        # Get all result reports
-        report_list = self.glob.lib.result.collect_reports()
-
-        # Iterate over result reports
-        for report in list(report_list):
-
-            # Iterate over search criteria
-            for key in search_dict:
-                match = False
-                # Key match in [bench] section
-                if report.bench:
-                    if key in report.bench:
-                        # Value match
-                        if search_dict[key] == report.bench[key]:
-                            match = True
-                # Key match in [build] section
-                if report.build:
-                    if key in report.build:
-                        # Value match
-                        if search_dict[key] == report.build[key]:
-                            match = True
-
-                if not match:   
-                    report_list.remove(report)
-                    break
+        # Get result reports matching search criteria
+        report_list = []
+        for result_type in ["pending", "captured", "failed"]:
+            report_list.extend(self.construct_list(self.glob.stg[result_type + '_path'], search_dict))
 
         # No result found
         if not report_list:
@@ -476,6 +546,7 @@ class init(object):
         for idx, result in enumerate(remove_list):
             self.glob.lib.msg.high("Deleting " + str(idx+1) + " of " + str(len(remove_list)))
             self.glob.lib.files.delete_dir(result.path)
+            self.glob.lib.index.drop_result(result.path)
         self.glob.lib.msg.high("Done.")
 
     def dry_run(self, jobid: str) -> bool:
@@ -488,6 +559,9 @@ class init(object):
         try:
             return int(task)
         except:
+            # Job array task: [jobid]_[index], or local executor task
+            if re.match(r"^\d+_\d+$", str(task)) or self.glob.lib.proc.is_task(task):
+                return task
             return 0
 
 
@@ -508,6 +582,19 @@ class init(object):
         if "dry" in report.bench['task_id']:
             return report.bench['task_id']
 
+        # Held in submit queue
+        if report.bench['task_id'] == "queued":
+            return "QUEUED"
+
+        # Dropped from submit queue
+        if report.bench['task_id'] == "failed":
+            return "FAILED"
+
+        # Completion marker written by job
+        marker = self.glob.lib.files.read_marker(report.path)
+        if marker:
+            return marker['status']
+
         # Query scheduler
         if report.bench['exec_mode'] == "sched":
 
@@ -0,0 +1,313 @@
+# System Imports
+import fcntl
+import glob as gb
+import json
+import os
+import re
+import subprocess
+import time
+from typing import List
+
+# Scheduler backends used by sched_handler, selected with 'sched_backend' in user.ini
+# Each backend provides:
+#   submit(script_path, dep, array)  -> [jobid, stderr], jobid is None if submission failed
+#   query(jobid_list)                -> {jobid: state} for jobs known to the scheduler, None if query failed
+#   list_user_jobs(days)             -> [{'jobid', 'name', 'state', 'nodelist'}] submitted by user in last N days, None if failed
+#   nodelists(jobid_list)            -> {jobid: nodelist string, eg. "c478-[094,102]"}, None if query failed
+#   queue_info(jobid_list)           -> lines to print for queue state of jobs
+# Dependencies are passed as 'afterany:1:2,afterok:3', array as [number of tasks, throttle]
+
+class Slurm(object):
+    def __init__(self, glob):
+        self.glob = glob
+
+    # Run scheduler command
+    def exec(self, cmd_line: str) -> list:
+
+        try:
+            cmd = subprocess.run(cmd_line, shell=True, check=True, \
+                                    capture_output=True, universal_newlines=True)
+
+        # If command failed
+        except subprocess.CalledProcessError as e:
+            self.glob.lib.msg.log(e.output.split("\n"))
+            return False, "", e.output.split("\n")
+
+        # If command succeeded
+        return True, cmd.stdout, cmd.stderr
+
+    # Strip out bad chars from job state: "CANCELLED by 1234" => "CANCELLED"
+    def clean_state(self, state: str) -> str:
+        state = state.strip().split(" ")[0]
+        return ''.join(c for c in state if c not in ['*', '+'])
+
+    # Expand pending job array ID: 123_[0-3,5%2] => [123_0, 123_1, 123_2, 123_3, 123_5]
+    def expand_array_id(self, jobid: str) -> list:
+        array = re.match(r"^(\d+)_\[([^\]]+)\]$", jobid)
+        if not array:
+            return [jobid]
+
+        jobid_list = []
+        for item in array.group(2).split("%")[0].split(","):
+            bounds = item.split("-")
+            try:
+                for idx in range(int(bounds[0]), int(bounds[-1]) + 1):
+                    jobid_list.append(array.group(1) + "_" + str(idx))
+            except ValueError:
+                continue
+        return jobid_list
+
+    # Get job ID from 'sbatch --parsable' output: [jobid] or [jobid];[cluster]
+    def parse_jobid(self, stdout: str) -> str:
+        jobid = stdout.strip().split("\n")[-1].split(";")[0].strip()
+        if not jobid.isdigit():
+            self.glob.lib.msg.error("Unable to read job ID from sbatch output '" + stdout.strip() + "'")
+        return jobid
+
+    def submit(self, script_path: str, dep: str = "", array: list = None) -> list:
+
+        cmd = "sbatch --parsable "
+        if array:
+            cmd += "--array=0-" + str(array[0] - 1) + ("%" + str(array[1]) if array[1] else "") + " "
+        if dep:
+            cmd += "--dependency=" + dep + " "
+
+        success, stdout, stderr = self.exec(cmd + script_path)
+        if not success:
+            return [None, stderr]
+
+        self.glob.lib.msg.log(stdout)
+        self.glob.lib.msg.log(stderr)
+        return [self.parse_jobid(stdout), stderr]
+
+    def query(self, jobid_list: List[str]) -> dict:
+
+        success, stdout, stderr = self.exec("sacct -X -P -n -j " + ",".join(jobid_list) + " --format JobID,State")
+        if not success:
+            return None
+
+        states = {}
+        # Parse 'JobID|State' lines
+        for line in stdout.splitlines():
+            fields = line.split("|")
+            if len(fields) < 2:
+                continue
+            for jobid in self.expand_array_id(fields[0].strip()):
+                states[jobid] = self.clean_state(fields[1])
+        return states
+
+    def list_user_jobs(self, days: int) -> List[dict]:
+
+        success, stdout, stderr = self.exec("sacct -u " + self.glob.user + " -X -P -n -S now-" + str(days) + \
+                                            "days --format JobID,JobName,State,NodeList")
+        if not success:
+            return None
+
+        jobs = []
+        # Parse 'JobID|JobName|State|NodeList' lines
+        for line in stdout.splitlines():
+            fields = line.split("|")
+            if len(fields) < 4:
+                continue
+            for jobid in self.expand_array_id(fields[0].strip()):
+                jobs.append({'jobid': jobid, 'name': fields[1].strip(), 'state': self.clean_state(fields[2]), 'nodelist': fields[3].strip()})
+        return jobs
+
+    def nodelists(self, jobid_list: List[str]) -> dict:
+
+        success, stdout, stderr = self.exec("sacct -X -P -n -j " + ",".join(jobid_list) + " --format JobID,NodeList")
+        if not success:
+            return None
+
+        nodelists = {}
+        # Parse 'JobID|NodeList' lines
+        for line in stdout.splitlines():
+            fields = line.split("|")
+            if len(fields) < 2:
+                continue
+            for jobid in self.expand_array_id(fields[0].strip()):
+                nodelists[jobid] = fields[1].strip()
+        return nodelists
+
+    def queue_info(self, jobid_list: List[str]) -> List[str]:
+        success, stdout, stderr = self.exec("squeue -a --job " + ",".join(jobid_list))
+        if success:
+            return stdout.split("\n")
+        return []
+
+
+# File based scheduler for testing, jobs are never run
+# Each job is PENDING for 'fake_queue_secs', RUNNING for 'fake_run_secs', then COMPLETED
+class Fake(object):
+    def __init__(self, glob):
+        self.glob = glob
+
+    # Path in fake scheduler dir
+    def path(self, *parts) -> str:
+        return os.path.join(self.glob.stg['fake_sched_path'], *parts)
+
+    # Get next job ID, file lock shared by concurrent invocations
+    def next_jobid(self) -> str:
+        os.makedirs(self.path("jobs"), exist_ok=True)
+        with open(self.path("next_jobid"), "a+") as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            fp.seek(0)
+            content = fp.read().strip()
+            jobid = int(content) if content.isdigit() else 1
+            fp.seek(0)
+            fp.truncate()
+            fp.write(str(jobid + 1))
+        return str(jobid)
+
+    # Read job record, None if unknown
+    def read_job(self, jobid: str) -> dict:
+        try:
+            with open(self.path("jobs", jobid.split("_")[0] + ".json")) as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    # Get job name and number of nodes from #SBATCH lines
+    def script_options(self, script_path: str) -> list:
+        name, nodes = os.path.basename(script_path), 1
+        with open(script_path) as fp:
+            for line in fp:
+                option = (line.split() + ["", ""])[1:3] if line.startswith("#SBATCH") else None
+                if not option:
+                    continue
+                if option[0] == "-J":
+                    name = option[1]
+                elif option[0].startswith("--job-name="):
+                    name = option[0].split("=", 1)[1]
+                elif option[0] == "-N" and option[1].isdigit():
+                    nodes = int(option[1])
+                elif option[0].startswith("--nodes=") and option[0].split("=", 1)[1].isdigit():
+                    nodes = int(option[0].split("=", 1)[1])
+        return [name, nodes]
+
+    # Get [start, end] times of job or array task, None if unknown
+    def task_times(self, jobid: str, record: dict = None) -> list:
+        record = record or self.read_job(jobid)
+        if not record:
+            return None
+        idx = int(jobid.split("_")[1]) if "_" in jobid else 0
+        if idx >= len(record['tasks']):
+            return None
+        return record['tasks'][idx]
+
+    # Get job state from elapsed time
+    def state(self, times: list) -> str:
+        now = time.time()
+        if now < times[0]:
+            return "PENDING"
+        if now < times[1]:
+            return "RUNNING"
+        return "COMPLETED"
+
+    def submit(self, script_path: str, dep: str = "", array: list = None) -> list:
+
+        name, nodes = self.script_options(script_path)
+        queue_secs = self.glob.stg['fake_queue_secs']
+        run_secs = self.glob.stg['fake_run_secs']
+
+        # Job starts once dependencies are finished, all fake jobs complete successfully
+        start = time.time() + queue_secs
+        for item in [item for item in dep.split(",") if item]:
+            for dep_id in item.split(":")[1:]:
+                times = self.task_times(str(dep_id))
+                if times:
+                    start = max(start, times[1])
+
+        # Array tasks run in waves of 'throttle' tasks
+        size, throttle = array or [1, 0]
+        tasks = [[start + (idx // throttle if throttle else 0) * run_secs,
+                  start + (idx // throttle + 1 if throttle else 1) * run_secs] for idx in range(size)]
+
+        jobid = self.next_jobid()
+        record = {'jobid':  jobid,
+                  'name':   name,
+                  'user':   self.glob.user,
+                  'script': script_path,
+                  'nodes':  nodes,
+                  'submit': time.time(),
+                  'array':  bool(array),
+                  'tasks':  tasks}
+
+        tmp_file = self.path("jobs", jobid + ".json.tmp")
+        with open(tmp_file, "w") as fp:
+            json.dump(record, fp)
+        os.replace(tmp_file, self.path("jobs", jobid + ".json"))
+
+        self.glob.lib.msg.log("Fake scheduler job " + jobid + " starts at " + str(int(start)))
+        return [jobid, []]
+
+    def query(self, jobid_list: List[str]) -> dict:
+        states = {}
+        records = {}
+        for jobid in jobid_list:
+            base = jobid.split("_")[0]
+            if base not in records:
+                records[base] = self.read_job(base)
+            times = self.task_times(jobid, records[base]) if records[base] else None
+            if times:
+                states[jobid] = self.state(times)
+        return states
+
+    def list_user_jobs(self, days: int) -> List[dict]:
+        jobs = []
+        start = time.time() - days * 86400
+        for job_file in gb.glob(self.path("jobs", "*.json")):
+            try:
+                with open(job_file) as fp:
+                    record = json.load(fp)
+            except (OSError, ValueError):
+                continue
+            if record['user'] != self.glob.user or record['submit'] < start:
+                continue
+            for idx, times in enumerate(record['tasks']):
+                jobid = record['jobid'] + ("_" + str(idx) if record['array'] else "")
+                jobs.append({'jobid':    jobid,
+                             'name':     record['name'],
+                             'state':    self.state(times),
+                             'nodelist': self.nodelist(jobid, record)})
+        return jobs
+
+    # Synthetic nodelist, assigned once job starts
+    def nodelist(self, jobid: str, record: dict = None) -> str:
+        record = record or self.read_job(jobid)
+        times = self.task_times(jobid, record) if record else None
+        if not times:
+            return None
+        if self.state(times) == "PENDING":
+            return "None assigned"
+
+        first = int(jobid.split("_")[0]) % 900 + 1
+        if record['nodes'] == 1:
+            return "fake-" + str(first).zfill(3)
+        return "fake-[" + str(first).zfill(3) + "-" + str(first + record['nodes'] - 1).zfill(3) + "]"
+
+    def nodelists(self, jobid_list: List[str]) -> dict:
+        nodelists = {}
+        for jobid in jobid_list:
+            nodelist = self.nodelist(jobid)
+            if nodelist:
+                nodelists[jobid] = nodelist
+        return nodelists
+
+    def queue_info(self, jobid_list: List[str]) -> List[str]:
+        lines = ["{:>12} {:>20} {:>10} {}".format("JOBID", "NAME", "STATE", "NODELIST")]
+        for jobid in jobid_list:
+            record = self.read_job(jobid)
+            if not record:
+                continue
+            for idx, times in enumerate(record['tasks']):
+                task_id = jobid + ("_" + str(idx) if record['array'] else "")
+                state = self.state(times)
+                if state != "COMPLETED":
+                    lines.append("{:>12} {:>20} {:>10} {}".format(task_id, record['name'][:20], state, self.nodelist(task_id, record)))
+        return lines
+
+
+# Available backends
+backends = {'slurm': Slurm,
+            'fake':  Fake}
@@ -1,27 +1,109 @@
 # System Imports
+from contextlib import contextmanager
+import fcntl
+import json
 import os
-import sys
+import re
 import subprocess
+import sys
 import time
 
+# Local Imports
+import src.library.sched_backend        as sched_backend
+
 class init(object):
     def __init__(self, glob):
             self.glob = glob
+            # Job states collected by bulk sacct queries, keyed by job ID
+            self.status_map = {}
+            # Recent jobs of this user from scheduler cache file, keyed by job ID
+            self.job_cache = None
+            # Node lists collected by bulk queries, keyed by job ID
+            self.nodelist_map = {}
+            # Scheduler backend, set on first use
+            self.backend = None
+
+    # Get scheduler backend selected in user.ini
+    def get_backend(self):
+        if not self.backend:
+            name = self.glob.stg['sched_backend']
+            if name not in sched_backend.backends:
+                self.glob.lib.msg.error("Unknown 'sched_backend' value '" + name + "', options are: " + \
+                                        ", ".join(sched_backend.backends))
+            self.backend = sched_backend.backends[name](self.glob)
+        return self.backend
+
+    # Refresh scheduler cache with one query for all recent jobs of this user
+    def refresh_job_cache(self) -> dict:
+
+        self.glob.lib.msg.log("Refreshing scheduler cache " + self.glob.stg['sched_cache_path'])
+        job_list = self.get_backend().list_user_jobs(self.glob.stg['sched_cache_days'])
+        if job_list is None:
+            return None
+
+        jobs = {job['jobid']: {'name': job['name'], 'state': job['state'], 'nodelist': job['nodelist']} for job in job_list}
+
+        cache = {'time': time.time(), 'user': self.glob.user, 'backend': self.glob.stg['sched_backend'], 'jobs': jobs}
+        self.write_job_cache(cache)
+        return cache
+
+    # Write scheduler cache file, via tmp file so other invocations never read partial file
+    def write_job_cache(self, cache: dict) -> None:
+        tmp_file = self.glob.stg['sched_cache_path'] + "." + str(os.getpid()) + ".tmp"
+        try:
+            with open(tmp_file, "w") as fp:
+                json.dump(cache, fp)
+            os.replace(tmp_file, self.glob.stg['sched_cache_path'])
+        except OSError as err:
+            self.glob.lib.msg.log("Unable to write scheduler cache: " + str(err))
 
-    # Run schduler related command 
-    def slurm_exec(self, cmd_line):
+    # Return dict of recent jobs from scheduler cache, refreshing if older than 'sched_cache_ttl'
+    def get_job_cache(self) -> dict:
 
-        try:
-            cmd = subprocess.run(cmd_line, shell=True, check=True, \
-                                    capture_output=True, universal_newlines=True)
+        if not self.glob.stg['sched_cache']:
+            return {}
 
-        # If command failed
-        except subprocess.CalledProcessError as e:
-            self.glob.lib.msg.log(e.output.split("\n"))
-            return False, "", e.output.split("\n")
+        # Cache in memory is still valid
+        if self.job_cache is not None:
+            if not self.job_cache or time.time() - self.job_cache['time'] < self.glob.stg['sched_cache_ttl']:
+                return self.job_cache.get('jobs', {})
 
-        # If command succeeded
-        return True, cmd.stdout, cmd.stderr
+        cache = None
+        # Read cache file written by this or another invocation
+        try:
+            with open(self.glob.stg['sched_cache_path']) as fp:
+                cache = json.load(fp)
+            if cache.get('user') != self.glob.user or cache.get('backend') != self.glob.stg['sched_backend'] or \
+               time.time() - cache['time'] >= self.glob.stg['sched_cache_ttl']:
+                cache = None
+        except (OSError, ValueError, KeyError, AttributeError):
+            cache = None
+
+        # Expired or missing
+        if not cache:
+            cache = self.refresh_job_cache()
+
+        # sacct unavailable, don't retry this session
+        self.job_cache = cache or {}
+        return self.job_cache.get('jobs', {})
+
+    # Add states from direct queries to scheduler cache
+    def merge_job_cache(self, states: dict) -> None:
+        if not states or not self.job_cache:
+            return
+        for jobid, state in states.items():
+            self.job_cache['jobs'].setdefault(jobid, {'name': "", 'state': "", 'nodelist': ""})['state'] = state
+        self.write_job_cache(self.job_cache)
+
+    # Add newly submitted jobs to scheduler cache as PENDING, so invocations within 'sched_cache_ttl' see them
+    def cache_submitted(self, jobid_list: list, name: str) -> None:
+        self.get_job_cache()
+        # Cache disabled or scheduler query failed
+        if not self.job_cache:
+            return
+        for jobid in jobid_list:
+            self.job_cache['jobs'][str(jobid)] = {'name': name, 'state': "PENDING", 'nodelist': "None assigned"}
+        self.write_job_cache(self.job_cache)
 
     # Return job status for job ID
     def task_status(self, jobid: int) -> str:
@@ -34,15 +116,63 @@ class init(object):
             if "local" in str(jobid):
                 return "COMPLETED"
 
-            # Query Slurm slurm accounting with job ID
-            success, stdout, stderr = self.slurm_exec("sacct -j " + str(jobid) + " --format State")
-            if success:
-                # Strip out bad chars from job state
-                if (len(stdout.split("\n")) > 2):
-                    return ''.join(c for c in stdout.split("\n")[2] if c not in [' ', '*', '+'])
-            
+            # Held in submit queue
+            if str(jobid) == "queued":
+                return "QUEUED"
+
+            # Dropped from submit queue
+            if str(jobid) == "failed":
+                return "FAILED"
+
+            # Use state from previous bulk query
+            if str(jobid) in self.status_map:
+                return self.status_map[str(jobid)]
+
+            # Use state from scheduler cache
+            jobs = self.get_job_cache()
+            if str(jobid) in jobs:
+                return jobs[str(jobid)]['state']
+
+            # Query scheduler with job ID
+            states = self.get_backend().query([str(jobid)])
+            if states and str(jobid) in states:
+                return states[str(jobid)]
+
             return "UNKNOWN"
 
+    # Get job states for a list of job IDs with one scheduler query per chunk, store in status_map
+    def bulk_task_status(self, jobid_list: list) -> dict:
+
+        # Skip dry run, local, cached and already resolved jobs
+        jobs = self.get_job_cache()
+        query_list = []
+        for jobid in [str(jobid) for jobid in jobid_list]:
+            if "dry" in jobid or "local" in jobid or jobid in ["queued", "failed"]:
+                continue
+            if jobid in self.status_map or jobid in jobs or jobid in query_list:
+                continue
+            query_list.append(jobid)
+
+        chunk_size = int(self.glob.stg['sched_query_chunk'])
+        for idx in range(0, len(query_list), chunk_size):
+            chunk = query_list[idx:idx + chunk_size]
+
+            self.glob.lib.msg.log("Querying state of " + str(len(chunk)) + " jobs")
+            states = self.get_backend().query(chunk)
+            if states is None:
+                continue
+            self.status_map.update(states)
+
+            # Jobs missing from accounting
+            for jobid in chunk:
+                if jobid not in self.status_map:
+                    self.status_map[jobid] = "UNKNOWN"
+
+        # Share queried states with other invocations
+        self.merge_job_cache({jobid: self.status_map[jobid] for jobid in query_list if jobid in self.status_map})
+
+        return {str(jobid): self.task_status(jobid) for jobid in jobid_list}
+
     # If build job is running, add dependency str
     def get_build_job_dependency(self):
 
@@ -71,84 +201,121 @@ class init(object):
 
     # Get Job IDs of RUNNING AND PENDNIG jobs
     def get_active_jobids(self, job_label):
-        # Get list of jobs from sacct
         running_jobs_list = []
-        job_list = None
 
-        success, stdout, stderr = self.slurm_exec("sacct -u " + self.glob.user)
-        job_list = stdout.split("\n")
+        # Get list of jobs from scheduler cache
+        if self.glob.stg['sched_cache']:
+            job_list = [dict(job, jobid=jobid) for jobid, job in self.get_job_cache().items()]
+        else:
+            job_list = self.get_backend().list_user_jobs(self.glob.stg['sched_cache_days']) or []
 
-        # Add RUNNING job IDs to list
         for job in job_list:
-            if "RUNNING" in job or "PENDING" in job:
-                # Check if job label matches
-                if job_label in job:
-                    running_jobs_list.append(int(job.split(" ")[0]))
+            # Add RUNNING job IDs with matching job label to list
+            if job['state'] in ["RUNNING", "PENDING"] and job_label in job['name']:
+                running_jobs_list.append(int(job['jobid'].split("_")[0]))
 
         # Sort
-        running_jobs_list.sort()
+        running_jobs_list = sorted(set(running_jobs_list))
         return running_jobs_list
 
 
-    # Get node suffixes from brackets: "[094-096]" => ['094', '095', '096']
-    def expand_range(self, suffix_str):
+    # Get node suffixes from brackets, keeping zero padding of range: "094-096,1" => ['094', '095', '096', '1']
+    def expand_range(self, suffix_str: str) -> list:
         suffix_list = []
         for suf in suffix_str.split(','):
             if '-' in suf:
-                start, end = suf.split('-')
-                tmp = range(int(start), int(end)+1)
-                tmp = [str(t).zfill(3) for t in tmp]
-                suffix_list.extend(tmp)
+                start, end = suf.split('-', 1)
+                suffix_list.extend([str(idx).zfill(len(start)) for idx in range(int(start), int(end)+1)])
             else:
                 suffix_list.append(suf)
         return suffix_list
 
-    # Parse SLURM nodelist to list: "c478-[094,102],c479-[032,094]" => ['c478-094', 'c478-102', 'c479-032', 'c479-094']
-    def parse_nodelist(self, slurm_nodes):
-        node_list = []
-        while slurm_nodes:
-            prefix_len = 4
-            # Expand brackets first
-            if '[' in slurm_nodes:
-                # Get position of first '[' and ']'
-                start = slurm_nodes.index('[')+1
-                end = slurm_nodes.index(']')
-                # Get node prefix for brackets, eg 'c478-'
-                prefix = slurm_nodes[start-6:start-1]
-                # Expand brackets
-                suffix = self.expand_range(slurm_nodes[start:end])
-                node_list.extend([prefix + s for s in suffix])
-                # Remove parsed nodes
-                slurm_nodes = slurm_nodes[:start-6] + slurm_nodes[end+2:]
-            # Extract remaining nodes
+    # Split hostlist on commas outside brackets: "c1-[1,2],c2" => ['c1-[1,2]', 'c2']
+    def split_hostlist(self, slurm_nodes: str) -> list:
+        hosts = []
+        depth = 0
+        start = 0
+        for idx, char in enumerate(slurm_nodes):
+            if char == '[':
+                depth += 1
+            elif char == ']':
+                depth -= 1
+            elif char == ',' and not depth:
+                hosts.append(slurm_nodes[start:idx])
+                start = idx + 1
+        hosts.append(slurm_nodes[start:])
+        return [host.strip() for host in hosts if host.strip()]
+
+    # Expand host with any number of bracket groups: "r[1-2]n[01-02]" => ['r1n01', 'r1n02', 'r2n01', 'r2n02']
+    def expand_host(self, host: str) -> list:
+        node_list = [""]
+        for part in re.split(r"(\[[^\]]*\])", host):
+            if part.startswith('[') and part.endswith(']'):
+                suffix_list = self.expand_range(part[1:-1])
+                node_list = [node + suf for node in node_list for suf in suffix_list]
             else:
-                additions = slurm_nodes.split(',')
-                node_list.extend([s.strip() for s in additions])
-                slurm_nodes = None
-
-        node_list.sort()
+                node_list = [node + part for node in node_list]
         return node_list
 
-    # Get NODELIST from sacct  using JOBID
-    def get_nodelist(self, jobid: int) -> str:
+    # Parse SLURM nodelist to list: "c478-[094,102],c479-[032,094]" => ['c478-094', 'c478-102', 'c479-032', 'c479-094']
+    def parse_nodelist(self, slurm_nodes: str) -> list:
+        # Job not started
+        if not slurm_nodes or slurm_nodes.strip() in ["None assigned", "(null)"]:
+            return []
 
-        success, stdout, stderr = self.slurm_exec("sacct -X -P -j  " + str(jobid) + " --format NodeList")
-        if success:
-            return self.parse_nodelist(stdout.split("\n")[1])
+        node_list = []
+        for host in self.split_hostlist(slurm_nodes):
+            node_list.extend(self.expand_host(host))
 
-        return ""
+        node_list.sort()
+        return node_list
 
-    # Set job dependency if max_running_jobs is reached
+    # Get nodelists for a list of job IDs with one scheduler query per chunk, store in nodelist_map
+    def bulk_nodelist(self, jobid_list: list) -> None:
+
+        jobs = self.get_job_cache()
+        query_list = []
+        for jobid in [str(jobid) for jobid in jobid_list]:
+            if "dry" in jobid or "local" in jobid or jobid in ["queued", "failed"] or jobid in self.nodelist_map or jobid in query_list:
+                continue
+            # Use node list from scheduler cache once job has started
+            job = jobs.get(jobid)
+            if job and job['state'] not in ["PENDING", ""] and job['nodelist']:
+                self.nodelist_map[jobid] = self.parse_nodelist(job['nodelist'])
+                continue
+            query_list.append(jobid)
+
+        chunk_size = int(self.glob.stg['sched_query_chunk'])
+        for idx in range(0, len(query_list), chunk_size):
+            chunk = query_list[idx:idx + chunk_size]
+
+            self.glob.lib.msg.log("Querying nodelist of " + str(len(chunk)) + " jobs")
+            nodelists = self.get_backend().nodelists(chunk)
+            if nodelists is None:
+                continue
+            for jobid, nodelist in nodelists.items():
+                self.nodelist_map[jobid] = self.parse_nodelist(nodelist)
+
+    # Get NODELIST from scheduler using JOBID
+    def get_nodelist(self, jobid: int) -> list:
+
+        if str(jobid) not in self.nodelist_map:
+            self.bulk_nodelist([jobid])
+
+        return self.nodelist_map.get(str(jobid), [])
+
+    # Set job dependency if max_running_jobs is reached: 'afterany:1:2,afterok:3'
     def get_dep_str(self):
 
-        dep = ""
+        dep = []
 
         if self.glob.any_dep_list:
-            dep += "--dependency=afterany:" + ":".join([str(x) for x in self.glob.any_dep_list]) + " "
+            dep.append("afterany:" + ":".join([str(x) for x in self.glob.any_dep_list]))
 
         if self.glob.ok_dep_list:
-            dep += "--dependency=afterok:" + ":".join([str(x) for x in self.glob.ok_dep_list]) + " " 
+            dep.append("afterok:" + ":".join([str(x) for x in self.glob.ok_dep_list]))
 
+        dep = ",".join(dep)
         if dep:
             self.glob.lib.msg.low("Job dependency string: " + dep)
 
@@ -163,30 +330,13 @@ class init(object):
                                 "",
                                 "Submitting to scheduler..."])
 
-        success, stdout, stderr = self.slurm_exec("sbatch " + self.get_dep_str() + script_path)
+        jobid, stderr = self.get_backend().submit(script_path, self.get_dep_str())
 
-        if not success:
+        if not jobid:
             self.glob.lib.msg.error(["failed to submit job to scheduler:"] + stderr)
 
-        self.glob.lib.msg.log(stdout)
-        self.glob.lib.msg.log(stderr)
-
-        jobid = None
-        jobid_line = "Submitted batch job"
-        
-        # Find job ID
-        for line in stdout.splitlines():
-            if jobid_line in line:
-                jobid = line.split(" ")[-1]
-
-        # Wait for slurm to queue job
-        time.sleep(1)
-            
-        # Get job in queue
-        success, stdout, stderr = self.slurm_exec("squeue -a --job " + jobid)
-
-        self.glob.lib.msg.low(stdout.split("\n") +
-                    ["",
+        self.glob.lib.msg.low(["Submitted batch job " + jobid,
+                    "",
                     "Job stdout:",
                     ">  "+ self.glob.lib.rel_path(
                         os.path.join(self.glob.config['metadata']['working_path'], 
@@ -196,24 +346,224 @@ class init(object):
                         os.path.join(self.glob.config['metadata']['working_path'], 
                                      self.glob.config['config']['stderr']))])
 
-        self.glob.lib.msg.log(stdout)
-        self.glob.lib.msg.log(stderr)
-
         # Store jobid in shared global object
         self.glob.task_id = jobid
+        self.glob.submitted_jobs.append(jobid)
+        self.cache_submitted([jobid], self.glob.sched['sched'].get('job_label', ""))
+
+    # Print queue state of submitted jobs with one scheduler query
+    def print_queue(self, jobid_list: list) -> None:
+        if not jobid_list:
+            return
+
+        lines = self.get_backend().queue_info([str(jobid) for jobid in jobid_list])
+        if lines:
+            self.glob.lib.msg.low([""] + lines)
+
+    # Hold lock on submit queue, shared by bench and drain invocations
+    @contextmanager
+    def lock_queue(self):
+        with open(self.glob.stg['submit_queue_path'] + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    # Read submit queue: {'queued': [task, ...], 'running': [[jobid, submit time], ...]}
+    def read_queue(self) -> dict:
+        try:
+            with open(self.glob.stg['submit_queue_path']) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return {'queued': [], 'running': []}
+        except (OSError, ValueError) as err:
+            self.glob.lib.msg.error("Unable to read submit queue " + self.glob.stg['submit_queue_path'] + ": " + str(err))
+
+    # Write submit queue via tmp file
+    def write_queue(self, queue: dict) -> None:
+        tmp_file = self.glob.stg['submit_queue_path'] + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_file, "w") as fp:
+            json.dump(queue, fp, indent=1)
+        os.replace(tmp_file, self.glob.stg['submit_queue_path'])
+
+    # Add job script to submit queue instead of submitting, drain() submits it once window has room
+    def enqueue(self, job_limit: int) -> None:
+
+        task = {'path':   self.glob.config['metadata']['working_path'],
+                'script': os.path.join(self.glob.config['metadata']['working_path'], self.glob.job_file),
+                'name':   self.glob.sched['sched'].get('job_label', ""),
+                'dep':    self.get_dep_str(),
+                'limit':  job_limit}
+
+        with self.lock_queue():
+            queue = self.read_queue()
+            queue['queued'].append(task)
+            self.write_queue(queue)
+
+        self.glob.lib.msg.low("Task added to submit queue, position " + str(len(queue['queued'])))
+        self.glob.task_id = "queued"
+
+    # Count jobs submitted outside the queue (job arrays) toward the window
+    def add_to_window(self, jobid_list: list) -> None:
+        with self.lock_queue():
+            queue = self.read_queue()
+            queue['running'].extend([str(jobid), time.time()] for jobid in jobid_list)
+            self.write_queue(queue)
+
+    # Check dependencies of queued task against current job states: 'afterany:1:2,afterok:3'
+    # Returns [dependency string without finished jobs, failed afterok dependency or None]
+    def recheck_dep(self, dep_str: str) -> list:
+        deps = []
+        for item in [item for item in dep_str.split(",") if item]:
+            dep_type = item.split(":")[0]
+            keep = []
+            for jobid in item.split(":")[1:]:
+                state = self.check_job_complete(jobid)
+                # Still pending or running, or missing from accounting
+                if not state or state == "UNKNOWN":
+                    keep.append(jobid)
+                elif dep_type == "afterok" and state != "COMPLETED":
+                    return [dep_str, jobid + " " + state]
+            if keep:
+                deps.append(dep_type + ":" + ":".join(keep))
+        return [",".join(deps), None]
+
+    # Submit queued tasks while fewer than 'limit' queue jobs are unfinished, return number still queued
+    def drain(self) -> int:
+
+        with self.lock_queue():
+            queue = self.read_queue()
+            if not queue['queued'] and not queue['running']:
+                return 0
+
+            # Get current states of window and dependency jobs
+            self.status_map = {}
+            dep_jobids = [jobid for task in queue['queued'] for item in task['dep'].split(",") if item for jobid in item.split(":")[1:]]
+            self.bulk_task_status([jobid for jobid, submit in queue['running']] + dep_jobids)
+
+            # Jobs can be missing from accounting just after submission
+            running = []
+            for jobid, submit in queue['running']:
+                state = self.check_job_complete(jobid)
+                if not state or (state == "UNKNOWN" and time.time() - submit < self.glob.stg['drain_interval']):
+                    running.append([jobid, submit])
+            queue['running'] = running
+
+            submitted = 0
+            while queue['queued'] and len(queue['running']) < int(queue['queued'][0]['limit']):
+                task = queue['queued'][0]
+
+                # Result was removed while queued
+                if not os.path.isfile(task['script']):
+                    self.glob.lib.msg.log("Dropping missing task " + task['script'] + " from submit queue")
+                    queue['queued'].pop(0)
+                    continue
+
+                # Dependencies saved at enqueue time may have finished since
+                dep, failed_dep = self.recheck_dep(task['dep'])
+                if failed_dep:
+                    self.glob.lib.msg.warn("Dependency job " + failed_dep + ", dropping queued task " + self.glob.lib.rel_path(task['path']))
+                    queue['queued'].pop(0)
+                    self.glob.lib.report.set_task_id(task['path'], "failed")
+                    continue
+
+                jobid, stderr = self.get_backend().submit(task['script'], dep)
+                if not jobid:
+                    self.glob.lib.msg.warn(["Failed to submit queued task " + self.glob.lib.rel_path(task['script']) + ":"] + stderr)
+                    task['attempts'] = task.get('attempts', 0) + 1
+                    # Rejected by scheduler, don't block tasks behind it
+                    if task['attempts'] >= 3 or any("dependency" in line.lower() for line in stderr):
+                        self.glob.lib.msg.warn("Dropping queued task " + self.glob.lib.rel_path(task['path']) + " after failed submission")
+                        queue['queued'].pop(0)
+                        self.glob.lib.report.set_task_id(task['path'], "failed")
+                        continue
+                    break
+
+                queue['queued'].pop(0)
+                queue['running'].append([jobid, time.time()])
+                self.glob.submitted_jobs.append(jobid)
+                self.cache_submitted([jobid], task.get('name', ""))
+                self.glob.lib.report.set_task_id(task['path'], jobid)
+                self.glob.lib.msg.low("Submitted queued task " + self.glob.lib.rel_path(task['path']) + " as job " + jobid)
+                submitted += 1
+
+            self.write_queue(queue)
+
+        if submitted or queue['queued']:
+            self.glob.lib.msg.high("Submitted " + str(submitted) + " queued tasks, " + str(len(queue['queued'])) + \
+                                   " waiting, " + str(len(queue['running'])) + " in window")
+        return len(queue['queued'])
+
+    # Keep submitting queued tasks until queue is empty, for 'benchpro --drain'
+    def drain_loop(self) -> None:
+        with open(self.glob.stg['submit_queue_path'] + ".drain", "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.glob.lib.msg.high("Submit queue is already being drained by another process.")
+                return
+
+            while True:
+                while self.drain():
+                    time.sleep(self.glob.stg['drain_interval'])
+                # Release lock, then check for tasks queued while exiting
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                if not self.read_queue()['queued']:
+                    break
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # Another drainer took over
+                except BlockingIOError:
+                    return
+        self.glob.lib.msg.high("Submit queue is empty.")
+
+    # Start detached 'benchpro --drain' process unless one is active
+    def start_drainer(self) -> None:
+
+        with open(self.glob.stg['submit_queue_path'] + ".drain", "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Drainer active, it picks up new tasks
+            except BlockingIOError:
+                return
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+        log_file = self.glob.stg['submit_queue_path'] + ".log"
+        try:
+            with open(log_file, "a") as log:
+                subprocess.Popen([sys.executable, os.path.abspath(sys.argv[0]), "--drain"],
+                                 stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        except OSError as e:
+            self.glob.lib.msg.error("Failed to start submit queue drainer: " + str(e))
+        self.glob.lib.msg.high("Remaining queued tasks are submitted in the background as running tasks finish, log: " + \
+                                self.glob.lib.rel_path(log_file))
+
+    # Check that exe of application is in install dir
+    def exe_installed(self, app, report: dict) -> bool:
+        exe = report['build']['exe_file']
+        if not exe:
+            return False
+
+        install_path = os.path.join(self.glob.ev['BP_APPS'], app, self.glob.stg['install_subdir'])
+        # Usual locations first, then search install dir
+        for path in [os.path.join(install_path, report['build'].get('bin_dir', ""), exe), os.path.join(install_path, "bin", exe)]:
+            if os.path.isfile(path):
+                return True
+        return self.glob.lib.files.exists(exe, install_path)
 
     # Get usable string of application status
-    def get_status_str(self, app):
+    def get_status_str(self, app, report: dict = None):
+
+        # Read application report file once
+        report = report or self.glob.lib.report.read(app)
 
         # Get execution mode (sched or local) from application report file
-        exec_mode = self.glob.lib.report.get_exec_mode("build", app)
+        exec_mode = report['build']['exec_mode'] if report else ""
 
         # Handle dry run applications
         if "dry" in exec_mode:
             return '\033[1;33mDRYRUN\033[0m'
 
         # Get Jobid from report file and check if status = COMPLETED
-        task_id = self.glob.lib.report.get_task_id("build", app)
+        task_id = report['build']['task_id'] if report else None
 
         # Unable to get task ID from report file
         if not task_id and not self.glob.args.delApp:
@@ -240,13 +590,8 @@ class init(object):
         # Complete state
         if status == "COMPLETED":
 
-            bin_dir, exe = self.glob.lib.report.get_build_exe(app)
-            if exe:
-                if self.glob.lib.files.exists(exe, os.path.join(self.glob.ev['BP_APPS'], 
-                                                                app, 
-                                                                self.glob.stg['install_subdir'])): 
-                                                                #bin_dir)):
-                    return self.glob.success
+            if self.exe_installed(app, report):
+                return self.glob.success
 
             return '\033[0;31mFAILED\033[0m'
 
@@ -265,3 +610,56 @@ class init(object):
 
 
 
+
+    # Get #SBATCH lines of job script which must match for jobs to share an array
+    def array_header(self, script_path: str) -> list:
+        header = []
+        with open(script_path) as fp:
+            for line in fp:
+                if not line.startswith("#SBATCH"):
+                    continue
+                option = (line.split() + [""])[1]
+                # Job name and output files are set per array task
+                if option in ["-J", "-o", "-e"] or option.startswith(("--job-name", "--output", "--error")):
+                    continue
+                header.append(line.strip())
+        return header
+
+    # Submit list of deferred tasks as one job array, set task_id of each task to [jobid]_[index]
+    def submit_array(self, task_list: list, header: list, dep_str: str, throttle: int) -> None:
+
+        first_path = task_list[0]['config']['metadata']['working_path']
+        script_path = os.path.join(first_path, "array." + self.glob.job_file)
+
+        script = ["#!/bin/bash",
+                  "#SBATCH -J " + self.glob.sched['sched']['job_label'],
+                  "#SBATCH -o " + os.path.join(first_path, "array_%a.log")] + header + \
+                 ["", "case $SLURM_ARRAY_TASK_ID in"]
+
+        # Run each task's job script in its working dir
+        for idx, task in enumerate(task_list):
+            working_path = task['config']['metadata']['working_path']
+            script.append("    " + str(idx) + ") cd " + working_path + " && bash " + os.path.join(working_path, self.glob.job_file) + \
+                          " > " + os.path.join(working_path, task['config']['config']['stdout']) + \
+                          " 2> " + os.path.join(working_path, task['config']['config']['stderr']) + " ;;")
+        script.append("esac")
+
+        self.glob.lib.files.write_list_to_file([line + "\n" for line in script], script_path)
+
+        self.glob.lib.msg.low(["Job array script for " + str(len(task_list)) + " tasks:",
+                                ">  " + self.glob.lib.rel_path(script_path),
+                                "",
+                                "Submitting to scheduler..."])
+
+        jobid, stderr = self.get_backend().submit(script_path, dep_str, [len(task_list), throttle])
+
+        if not jobid:
+            self.glob.lib.msg.error(["failed to submit job array to scheduler:"] + stderr)
+
+        self.glob.submitted_jobs.append(jobid)
+
+        for idx, task in enumerate(task_list):
+            task['task_id'] = jobid + "_" + str(idx)
+        self.cache_submitted([task['task_id'] for task in task_list], self.glob.sched['sched'].get('job_label', ""))
+
+        self.glob.lib.msg.low("Submitted job array " + jobid + " with " + str(len(task_list)) + " tasks")
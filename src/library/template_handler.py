@@ -6,6 +6,12 @@ import re
 import shutil as su
 import sys
 
+# <<<key>>> placeholder, captured key is kept by re.split
+placeholder = re.compile(r"<<<([^<>]*?)>>>")
+
+# Compiled templates shared by all inputs in session: {tuple(lines): [segments per line]}
+compiled_templates = {}
+
 class init(object):
     def __init__(self, glob):
         self.glob = glob
@@ -177,9 +183,23 @@ class init(object):
 
     # Add things to the bootom of the bench script
     def bench_epilog(self, template_obj):
+        # Exit code of user section
+        template_obj.append("bp_exit_code=$? \n")
+
         # Collect stats
         self.collect_stats(template_obj)
 
+        # Timestamp
+        template_obj.append("echo \"END `date +\"%Y\"-%m-%dT%T` `date +\"%s\"`\" \n")
+
+        # Write completion marker to result dir, read by result.status() instead of querying the scheduler
+        if self.glob.stg['completion_marker']:
+            marker_file = os.path.join(self.glob.config['metadata']['working_path'], self.glob.stg['complete_file'])
+            template_obj.append("if [ $bp_exit_code -eq 0 ]; then bp_status=COMPLETED; else bp_status=FAILED; fi \n")
+            template_obj.append("printf '{\"status\": \"%s\", \"exit_code\": %d, \"end_time\": \"%s\", \"end_secs\": %d}\\n' " + \
+                                "$bp_status $bp_exit_code `date +\"%Y\"-%m-%dT%T` `date +\"%s\"` > " + marker_file + ".tmp && mv " + \
+                                marker_file + ".tmp " + marker_file + " \n")
+
     # Add dependency to build process (if building locally)
     def add_process_dep(self, template_obj):
 
@@ -193,32 +213,67 @@ class init(object):
         else:
             self.glob.lib.msg.error("Unable to read pid dependency template " + self.glob.lib.rel_path(dep_file))
 
-    # Contextualizes template script with variables from a list of config dicts
-    def populate_template(self, cfg_dicts, template_obj):
-        self.glob.lib.msg.log("Populating template file " + self.glob.tmp_job_file)
-        # For each config dict
+    # Split template lines into literal and <<<key>>> placeholder segments, cached by template content
+    def compile_template(self, template_obj):
+        key = tuple(template_obj)
+        if key not in compiled_templates:
+            # [[literal, key, literal, key, ..., literal], ...] one list per line
+            compiled_templates[key] = [placeholder.split(line) for line in template_obj]
+        return compiled_templates[key]
+
+    # Merge list of config dicts into single lookup, first dict containing a key takes precedence
+    def merge_dicts(self, cfg_dicts):
+        lookup = {}
         for cfg in cfg_dicts:
-            # For each key, find and replace <<<key>>> in template file
             for key in cfg:
+                if str(key) not in lookup:
+                    val = cfg[key]
+                    if isinstance(val, list):
+                        val = val[0]
+                    lookup[str(key)] = str(val)
+        return lookup
+
+    # Fill placeholders in compiled lines, returns [template_obj, unfilled <<<keys>>>]
+    def render(self, cfg_dicts, template_obj):
+        lookup = self.merge_dicts(cfg_dicts)
+        template_obj, missing = self.render_lines(self.compile_template(template_obj), lookup, 0)
+        self.glob.lib.msg.log("Populated template with " + str(len(lookup)) + " keys, " + str(len(missing)) + " unfilled")
+        return [template_obj, missing]
+
+    def render_lines(self, compiled, lookup, depth):
+        template_obj = []
+        missing = []
+        for segments in compiled:
+            line = segments[0]
+            # Odd segments are placeholder keys
+            for idx in range(1, len(segments), 2):
+                key = segments[idx]
+                if key in lookup:
+                    val = lookup[key]
+                    # Value contains placeholders of its own
+                    if "<<<" in val and depth < 8:
+                        [val], val_missing = self.render_lines(self.compile_template([val]), lookup, depth + 1)
+                        missing.extend(val_missing)
+                    line += val
+                else:
+                    line += "<<<" + key + ">>>"
+                    missing.append("<<<" + key + ">>>")
+                line += segments[idx + 1]
+            template_obj.append(line)
+        return [template_obj, missing]
 
-                val = cfg[key]
-                if isinstance(val, list):
-                    val = val[0]
-
-                # Replace <<<blah>>> with key[val]
-                template_obj = [line.replace("<<<" + str(key) + ">>>", str(val)) for line in template_obj]
-                self.glob.lib.msg.log("Replacing " + "<<<" + str(key) + ">>> with " + str(val) + " from " + str(cfg))
-
-        return template_obj
-    # Check for unpopulated <<<keys>>> in template file
-    def test_template(self, template_file, template_obj):
+    # Contextualizes template script with variables from a list of config dicts
+    def populate_template(self, cfg_dicts, template_obj):
+        self.glob.lib.msg.log("Populating template file " + self.glob.tmp_job_file)
+        return self.render(cfg_dicts, template_obj)[0]
 
-        #print(self.glob.sched)
-        #print("ALLOCATION", self.glob.sched['sched']['allocation'])
+    # Check for unpopulated <<<keys>>> in template file, missing list from render() saves scanning template
+    def test_template(self, template_file, template_obj, unfilled_keys=None):
 
-        key = "<<<.*>>>"
-        unfilled_keys = [re.search(key, line) for line in template_obj]
-        unfilled_keys = [match.group(0) for match in unfilled_keys if match]
+        if unfilled_keys is None:
+            unfilled_keys = [match.group(0) for match in [re.search("<<<.*>>>", line) for line in template_obj] if match]
+        # Report each key once
+        unfilled_keys = list(dict.fromkeys(unfilled_keys))
 
         if len(unfilled_keys) > 0:
             # Conitue regardless
@@ -322,7 +377,7 @@ class init(object):
 
         # Populate template list with cfg dicts
         self.glob.lib.msg.low("Populating template...")
-        template_obj = self.populate_template(  [self.glob.config['metadata'], \
+        template_obj, missing = self.render([self.glob.config['metadata'], \
                                                 self.glob.config['general'], \
                                                 self.glob.config['modules'], \
                                                 self.glob.config['config'], \
@@ -334,7 +389,7 @@ class init(object):
 
         # Test for missing parameters
         self.glob.lib.msg.low("Validating template...")
-        self.test_template(self.glob.tmp_job_file, template_obj)
+        self.test_template(self.glob.tmp_job_file, template_obj, missing)
 
         # Write populated script to file
         self.glob.lib.msg.low(["Writing template... ", ""])
@@ -421,8 +476,8 @@ class init(object):
 
         template_obj.append("#!/bin/bash \n")
 
-        # Create dep to running build shell on local node
-        if self.glob.prev_pid:
+        # Create dep to running build shell on local node, local executor tasks wait for build task instead
+        if self.glob.prev_pid and not self.glob.lib.proc.is_task(self.glob.prev_pid):
             self.glob.config['config']['pid'] = self.glob.prev_pid
             self.add_process_dep(template_obj)  
 
@@ -449,16 +504,13 @@ class init(object):
         # Add bench template to script
         template_obj = self.add_bench(template_obj)
 
-        # Add epilog to end of script
+        # Add epilog and end timestamp to end of script
         self.bench_epilog(template_obj)
 
-        # Timestamp
-        template_obj.append("echo \"END `date +\"%Y\"-%m-%dT%T` `date +\"%s\"`\" \n")
-
         self.glob.lib.msg.low("Populating template...")
         # Take multiple config dicts and populate script template
         if self.glob.stg['exec_mode'] == "sched":
-            template_obj = self.populate_template([self.glob.config['metadata'], \
+            template_obj, missing = self.render([self.glob.config['metadata'], \
                                              self.glob.config['runtime'], \
                                              self.glob.config['config'], \
                                              self.glob.config['result'], \
@@ -468,7 +520,7 @@ class init(object):
                                              template_obj)
     
         else:
-            template_obj = self.populate_template([self.glob.config['metadata'], \
+            template_obj, missing = self.render([self.glob.config['metadata'], \
                                             self.glob.config['runtime'], \
                                             self.glob.config['config'], \
                                             self.glob.config['result'], \
@@ -478,7 +530,7 @@ class init(object):
 
         self.glob.lib.msg.low("Validating template...")
         # Test for missing parameters
-        self.test_template(self.glob.tmp_job_file, template_obj)
+        self.test_template(self.glob.tmp_job_file, template_obj, missing)
 
         # Write populated script to file
         self.glob.lib.msg.low(["Writing template... ", ""])
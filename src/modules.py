@@ -11,10 +11,11 @@ from packaging import version
 
 class Report():
 
-    def read_report(self):
+    def read_report(self, report=None):
 
         self.success = True
-        self.report         = self.glob.lib.report.read(self.path)
+        # Use report from results index if provided
+        self.report         = report or self.glob.lib.report.read(self.path)
         if not self.report:
             self.success = False
             return 
@@ -25,12 +26,12 @@ class Report():
         except:
             self.glob.msg.warn("Report " + self.path + " ")
 
-    def __init__(self, path: str):
+    def __init__(self, path: str, report: dict = None):
         self.path = path
         self.build = {}
         self.bench = {}
         self.result = {}
-        self.read_report()
+        self.read_report(report)
 
 class Application(Report):
 
@@ -51,19 +52,25 @@ class Result(Report):
         self.status = "OLD"
         self.complete = False
         self.value = None
+        self.cached = False
+        self.output_path = None
 
         if self.success:
 
-            self.bench = self.report['bench']
-            self.result = self.report['result']
-            self.unit = self.result['unit']
-            self.task_id        = self.glob.lib.result.task_id(self.bench['task_id'])
+            self.set_report()
             self.status         = self.glob.lib.result.status(self)
             self.complete       = self.glob.lib.result.complete(self)
-            self.value          = self.glob.lib.result.retrieve(self.path)
+            self.value          = self.glob.lib.result.retrieve(self)
             self.glob.lib.files.cache(self)
 
 
+    def set_report(self):
+        self.bench          = self.report['bench']
+        self.result         = self.report['result']
+        self.unit           = self.result['unit']
+        self.task_id        = self.glob.lib.result.task_id(self.bench['task_id'])
+
+
     def set_vars(self):
         self.stdout_path    = os.path.join(self.bench['path'], self.bench['stdout'])
         self.stderr_path    = os.path.join(self.bench['path'], self.bench['stderr'])
@@ -93,12 +100,12 @@ class Result(Report):
 
 
     def set_start(self) -> None:
-        start_line          = self.glob.lib.files.get_timestamp("START", self.get_stdout())
+        start_line          = self.glob.lib.files.get_timestamp("START", self.stdout_path)
         self.submit_time     = start_line.split(" ")[1]
         self.start_secs     = int(start_line.split(" ")[2])
 
     def set_end(self) -> None:
-        end_line          = self.glob.lib.files.get_timestamp("END", self.get_stdout())
+        end_line          = self.glob.lib.files.get_timestamp("END", self.stdout_path)
         self.end_time     = end_line.split(" ")[1]
         self.end_secs     = int(end_line.split(" ")[2])
 
@@ -134,9 +141,13 @@ class Result(Report):
         return ", ".join(self.nodelist)
 
 
-    def __init__(self, result_path: str) -> None:
-        super().__init__(result_path)
+    def __init__(self, result_path: str, process: bool = True, report: dict = None) -> None:
+        super().__init__(result_path, report)
 
         if self.success:
-            self.process()
+            self.set_report()
             self.set_vars()
+
+        # Processing can be deferred to batch scheduler queries
+        if process:
+            self.process()